@@ -2,8 +2,49 @@ import os
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 
+# directory of the SQLite database, e.g. a volume mounted by docker compose
+DATA_DIR = os.environ.get("SCHEDULER_DATA_DIR", BASE_DIR)
+
 # log directory
 LOG_DIR = "logs"
 LOG_FILE = "scheduler.log"
 LOG_PATH = os.path.join(BASE_DIR, LOG_DIR, LOG_FILE)
 os.makedirs(LOG_DIR, exist_ok=True)
+
+# PRAGMAs run on every new SQLite connection, set SQLITE_PRAGMAS = {} to skip them.
+# In WAL mode readers go on while a booking writes, and synchronous=NORMAL
+# only risks the last commits on power loss. busy_timeout is in ms, a negative
+# cache_size is in KiB and mmap_size is in bytes.
+# The -wal and -shm files live next to the database file, so mount DATA_DIR
+# rather than the file alone, or the commits not yet checkpointed into the
+# database file are lost with the container.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "busy_timeout": 5000,
+    "synchronous": "NORMAL",
+    "cache_size": -16000,
+    "mmap_size": 134217728,
+}
+
+# Connection pool of the server databases (PostgreSQL), merged under
+# SQLALCHEMY_ENGINE_OPTIONS. Each gunicorn worker has its own pool, so keep
+# workers * (pool_size + max_overflow) below the server's max_connections.
+# pool_timeout is the wait for a free connection in seconds, pool_recycle
+# drops connections older than it and pool_pre_ping replaces the ones the
+# server closed, e.g. after a restart.
+DATABASE_POOL_OPTIONS = {
+    "pool_size": 5,
+    "max_overflow": 5,
+    "pool_timeout": 10,
+    "pool_recycle": 1800,
+    "pool_pre_ping": True,
+}
+
+# Schedule streams (server-sent events). Each open stream holds a gunicorn
+# worker thread, so a process serves at most SCHEDULE_STREAM_MAX streams and
+# keeps its other threads (--threads) for the other requests; raise both
+# together. Without a SCHEDULE_EVENT_BROKER reaching all the workers, one
+# thread per process polls the versions of the streamed dates every
+# SCHEDULE_STREAM_POLL seconds for the changes of the other processes.
+SCHEDULE_STREAM_MAX = 4
+SCHEDULE_STREAM_POLL = 5
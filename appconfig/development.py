@@ -1,7 +1,7 @@
 import os
 
-from appconfig.default import BASE_DIR
+from appconfig.default import DATA_DIR
 
-SQLALCHEMY_DATABASE_URI = "sqlite:///{}".format(os.path.join(BASE_DIR, "scheduler.db"))
+SQLALCHEMY_DATABASE_URI = "sqlite:///{}".format(os.path.join(DATA_DIR, "scheduler.db"))
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 SECRET_KEY = "dev"
@@ -0,0 +1,48 @@
+"""add composite indexes for session, timeslot and worker lookups
+
+Revision ID: 17b682bf05dd
+Revises: 
+Create Date: 2026-10-18 15:34:00.519442
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '17b682bf05dd'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (index name, table name, columns)
+INDEXES = [
+    (
+        "ix_dosu_session_table_dosusess_date_status",
+        "dosu_session_table",
+        ["dosusess_date", "status"],
+    ),
+    (
+        "ix_dosu_session_table_worker_id_dosusess_date",
+        "dosu_session_table",
+        ["worker_id", "dosusess_date"],
+    ),
+    (
+        "ix_dosu_session_table_patient_id_dosusess_date",
+        "dosu_session_table",
+        ["patient_id", "dosusess_date"],
+    ),
+    ("ix_timeslot_table_dosusess_id", "timeslot_table", ["dosusess_id"]),
+    ("ix_worker_table_room_available", "worker_table", ["room", "available"]),
+]
+
+
+def upgrade():
+    # databases created by db.create_all() already have the indexes
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
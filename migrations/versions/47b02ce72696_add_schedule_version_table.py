@@ -0,0 +1,33 @@
+"""add schedule version table
+
+Revision ID: 47b02ce72696
+Revises: cd0b20a09b37
+Create Date: 2026-10-18 15:41:53.652648
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '47b02ce72696'
+down_revision = 'cd0b20a09b37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() may have created the table already
+    if not sa.inspect(op.get_bind()).has_table("schedule_version_table"):
+        op.create_table(
+            "schedule_version_table",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("scope", sa.String(), nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("id", name=op.f("pk_schedule_version_table")),
+            sa.UniqueConstraint("scope", name=op.f("uq_schedule_version_table_scope")),
+        )
+
+
+def downgrade():
+    op.drop_table("schedule_version_table")
@@ -0,0 +1,44 @@
+"""add dosusess tombstone table
+
+Revision ID: 8e3a51c4d2f7
+Revises: 47b02ce72696
+Create Date: 2026-10-18 16:22:07.318254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e3a51c4d2f7'
+down_revision = '47b02ce72696'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() may have created the table already
+    if not sa.inspect(op.get_bind()).has_table("dosusess_tombstone_table"):
+        op.create_table(
+            "dosusess_tombstone_table",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("dosusess_id", sa.Integer(), nullable=False),
+            sa.Column("dosusess_date", sa.Date(), nullable=False),
+            sa.Column("deleted_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("id", name=op.f("pk_dosusess_tombstone_table")),
+        )
+    op.create_index(
+        "ix_dosusess_tombstone_table_dosusess_date_deleted_at",
+        "dosusess_tombstone_table",
+        ["dosusess_date", "deleted_at"],
+        unique=False,
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "ix_dosusess_tombstone_table_dosusess_date_deleted_at",
+        table_name="dosusess_tombstone_table",
+    )
+    op.drop_table("dosusess_tombstone_table")
@@ -0,0 +1,60 @@
+"""add daily summary table
+
+Revision ID: cd0b20a09b37
+Revises: 17b682bf05dd
+Create Date: 2026-10-18 15:39:01.470797
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cd0b20a09b37'
+down_revision = '17b682bf05dd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() may have created the table already, empty
+    if not sa.inspect(op.get_bind()).has_table("daily_summary_table"):
+        op.create_table(
+            "daily_summary_table",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("summary_date", sa.Date(), nullable=False),
+            sa.Column("worker_id", sa.Integer(), nullable=False),
+            sa.Column("dosutype_id", sa.Integer(), nullable=False),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("blocked", sa.Boolean(), nullable=False),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.Column("amount", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("id", name=op.f("pk_daily_summary_table")),
+            sa.UniqueConstraint(
+                "summary_date",
+                "worker_id",
+                "dosutype_id",
+                "status",
+                "blocked",
+                name="unique_daily_summary_constraint",
+            ),
+        )
+
+    # fill it from the existing sessions
+    op.execute("DELETE FROM daily_summary_table")
+    op.execute(
+        """
+        INSERT INTO daily_summary_table
+            (summary_date, worker_id, dosutype_id, status, blocked, count, amount)
+        SELECT s.dosusess_date, s.worker_id, s.dosutype_id, s.status,
+               CASE WHEN p.mrn = 0 THEN TRUE ELSE FALSE END,
+               count(s.id), coalesce(sum(s.price), 0)
+        FROM dosu_session_table s
+        JOIN patient_table p ON s.patient_id = p.id
+        GROUP BY s.dosusess_date, s.worker_id, s.dosutype_id, s.status, p.mrn = 0
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("daily_summary_table")
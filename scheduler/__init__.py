@@ -1,10 +1,11 @@
+import threading
 from datetime import datetime
 
 from flask import Flask, render_template
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf import CSRFProtect
-from sqlalchemy import MetaData, text
+from sqlalchemy import MetaData, event, text
 from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.routing import BaseConverter, ValidationError
 
@@ -59,9 +60,74 @@ def check_database_connection(app):
         raise
 
 
+def register_readiness_check(app):
+    """
+    Checks the database connection on the first request of the process
+    instead of at boot. While the check fails, requests get a 503
+    and the next one checks again
+    """
+    ready = threading.Event()
+    lock = threading.Lock()
+
+    @app.before_request
+    def ensure_database_ready():
+        if ready.is_set():
+            return None
+        with lock:
+            if not ready.is_set():
+                try:
+                    check_database_connection(app)
+                except SQLAlchemyError:
+                    return render_template("503.html"), 503
+                ready.set()
+        return None
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def configure_sqlite(app):
+    """
+    Applies the SQLITE_PRAGMAS of the config to every new SQLite connection
+    """
+    pragmas = app.config.get("SQLITE_PRAGMAS")
+    if not pragmas or not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        return
+
+    with app.app_context():
+        event.listen(
+            db.engine,
+            "connect",
+            lambda dbapi_connection, _: apply_sqlite_pragmas(
+                dbapi_connection, pragmas
+            ),
+        )
+
+
+def configure_pool(app):
+    """
+    Sets up the DATABASE_POOL_OPTIONS of the config and the pool metrics
+    for server databases. SQLALCHEMY_ENGINE_OPTIONS take precedence
+    """
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        return
+
+    from .pool import MeteredQueuePool
+
+    options = dict(app.config.get("DATABASE_POOL_OPTIONS") or {})
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    options.setdefault("poolclass", MeteredQueuePool)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+
 def create_app(test_config=None):
     app = Flask(__name__)
     # app.config.from_object(config)
+    app.config.from_object("appconfig.default")
     app.config.from_envvar("APP_CONFIG_FILE")
 
     # ORM
@@ -70,16 +136,21 @@ def create_app(test_config=None):
     else:
         migrate.init_app(app, db)
 
+    configure_pool(app)
     db.init_app(app)
+    configure_sqlite(app)
 
-    # Check database connectivity
-    check_database_connection(app)
+    # Check database connectivity on the first request, the tables and
+    # the default records are set up by `flask init-db` and `flask seed-defaults`
+    register_readiness_check(app)
 
     csrf = CSRFProtect(app)
 
     app.url_map.converters["date"] = DateConverter
 
-    from . import custom_filters
+    from . import cli, custom_filters
+    from .cache import schedule_cache
+    from .events import schedule_events
     from .views import (
         auth_views,
         config_views,
@@ -101,10 +172,9 @@ def create_app(test_config=None):
     app.register_blueprint(auth_views.bp)
     app.register_blueprint(config_views.bp)
 
-    with app.app_context():
-        db.create_all()
-        from scheduler.defaults import create_defaults
-        create_defaults()
+    cli.init_app(app)
+    schedule_cache.init_app(app)
+    schedule_events.init_app(app)
 
     app.register_error_handler(404, page_not_found)
 
@@ -0,0 +1,769 @@
+import random
+import time
+from datetime import date, timedelta
+from functools import wraps
+from typing import Iterable
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+
+from scheduler import db
+from scheduler.models import (
+    DateTable,
+    DosuSess,
+    DosuType,
+    Patient,
+    TimeSlot,
+    Worker,
+    apply_daily_summary_deltas,
+    bump_schedule_versions,
+    dialect_insert,
+    get_scope_versions,
+    record_dosusess_tombstones,
+)
+from scheduler.occupancy import is_free, occupancy_index
+
+# A booking waiting on another one's lock for longer than the database's
+# own timeout is retried after BOOKING_BACKOFF seconds, doubled each time
+# and jittered so that the waiting workers don't retry in lockstep.
+BOOKING_RETRIES = 3
+BOOKING_BACKOFF = 0.05
+
+
+class BookingError(Exception):
+    """
+    Base of the errors a booking reports back to the user
+    """
+
+    reason = "error"
+
+    def to_dict(self) -> dict:
+        return {"error": self.reason, "message": str(self)}
+
+
+class BookingConflict(BookingError):
+    """
+    The requested timeslots are already assigned to other dosusesses
+    """
+
+    reason = "conflict"
+
+    def __init__(self, sess_date: date, room: int, taken: dict = None):
+        # taken maps the slot numbers to the dosusesses holding them,
+        # unknown when the conflict is only detected by the constraint
+        self.sess_date = sess_date
+        self.room = room
+        self.slots = sorted(taken or {})
+        self.dosusess_ids = sorted(set((taken or {}).values()))
+        slots = f" {self.slots}" if self.slots else ""
+        super().__init__(
+            f"Timeslots{slots} of room {room} on {sess_date} are already taken"
+        )
+
+    def to_dict(self) -> dict:
+        return dict(
+            super().to_dict(),
+            date=self.sess_date.isoformat(),
+            room=self.room,
+            slots=self.slots,
+            dosusess_ids=self.dosusess_ids,
+        )
+
+
+class BookingSeriesConflict(BookingError):
+    """
+    Some occurrences of a series are taken, reported per occurrence
+    """
+
+    reason = "conflict"
+
+    def __init__(self, conflicts: list):
+        self.conflicts = conflicts
+        super().__init__(f"{len(conflicts)} of the occurrences are taken")
+
+    def to_dict(self) -> dict:
+        return dict(
+            super().to_dict(),
+            occurrences=[conflict.to_dict() for conflict in self.conflicts],
+        )
+
+
+class BookingBusy(BookingError):
+    """
+    The schedule stayed locked by other bookings through all the retries
+    """
+
+    reason = "busy"
+
+    def __init__(self, attempts: int):
+        self.attempts = attempts
+        super().__init__(f"The schedule is busy, gave up after {attempts} attempts")
+
+    def to_dict(self) -> dict:
+        return dict(super().to_dict(), attempts=self.attempts)
+
+
+class BookingNotFound(BookingError):
+    """
+    The dosusess to change was deleted in the meantime
+    """
+
+    reason = "not_found"
+
+    def __init__(self, dosusess_id: int):
+        self.dosusess_id = dosusess_id
+        super().__init__(f"Dosusess {dosusess_id} not found")
+
+
+def _is_timeslot_conflict(error: IntegrityError) -> bool:
+    # postgresql names the constraint, sqlite lists its columns
+    message = str(error.orig)
+    return (
+        "unique_timeslot_constraint" in message
+        or "timeslot_table.date_id, timeslot_table.room, timeslot_table.number"
+        in message
+    )
+
+
+def _is_lock_timeout(error: OperationalError) -> bool:
+    message = str(error.orig).lower()
+    return any(
+        text in message
+        for text in (
+            "database is locked",
+            "deadlock detected",
+            "could not serialize",
+            "lock timeout",
+        )
+    )
+
+
+def with_booking_retry(operation):
+    """
+    Runs the booking operation in its own transaction, and again after a
+    backoff when it timed out waiting for a lock. The operation must redo
+    all its changes when called again, as the rollback discards them.
+
+    Raises:
+        BookingBusy: when the lock could not be taken in BOOKING_RETRIES retries
+    """
+
+    @wraps(operation)
+    def wrapper(*args, **kwargs):
+        for attempt in range(BOOKING_RETRIES + 1):
+            try:
+                return operation(*args, **kwargs)
+            except OperationalError as e:
+                db.session.rollback()
+                if not _is_lock_timeout(e):
+                    raise
+            if attempt < BOOKING_RETRIES:
+                time.sleep(BOOKING_BACKOFF * 2**attempt * (1 + random.random()))
+        raise BookingBusy(BOOKING_RETRIES + 1)
+
+    return wrapper
+
+
+def lock_dates(dates: Iterable[date], create: bool = True) -> dict:
+    """
+    Serializes the bookings of the dates until the end of the transaction
+    and returns {date: id} of their DateTable rows, creating the missing ones
+    unless create is False, e.g. when only removing from the dates.
+    On postgresql the date rows are locked with SELECT .. FOR UPDATE in id
+    order, so the bookings of other dates go on and overlapping series don't
+    deadlock. On sqlite, which has a single writer, the transaction starts
+    with BEGIN IMMEDIATE to take the write lock before the conflict probe
+    instead of failing to upgrade its read lock at insert.
+    It must be called before anything is written in the transaction
+    """
+    dates = sorted(set(dates))
+    connection = db.session.connection()
+    if connection.dialect.name == "sqlite":
+        if not connection.connection.dbapi_connection.in_transaction:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    stmt = db.select(DateTable.date, DateTable.id).filter(DateTable.date.in_(dates))
+    date_ids = dict(db.session.execute(stmt).all())
+    missing = [sess_date for sess_date in dates if sess_date not in date_ids]
+    if missing and create:
+        insert = dialect_insert(connection)
+        db.session.execute(
+            insert(DateTable).on_conflict_do_nothing(index_elements=["date"]),
+            [{"date": sess_date} for sess_date in missing],
+        )
+        date_ids = dict(db.session.execute(stmt).all())
+
+    if connection.dialect.name == "postgresql":
+        db.session.execute(
+            db.select(DateTable.id)
+            .filter(DateTable.id.in_(date_ids.values()))
+            .order_by(DateTable.id)
+            .with_for_update()
+        )
+    return date_ids
+
+
+def lock_date(sess_date: date) -> int:
+    """
+    lock_dates of a single date, returns the id of its DateTable row
+    """
+    return lock_dates([sess_date])[sess_date]
+
+
+def find_taken_slots(
+    date_id: int, room: int, slots: Iterable[int], dosusess_id: int = None
+) -> dict:
+    """
+    Returns {slot number: dosusess id} of the slots assigned to a dosusess
+    other than dosusess_id
+    """
+    stmt = db.select(TimeSlot.number, TimeSlot.dosusess_id).filter(
+        TimeSlot.date_id == date_id,
+        TimeSlot.room == room,
+        TimeSlot.number.in_(list(slots)),
+    )
+    if dosusess_id is not None:
+        stmt = stmt.filter(TimeSlot.dosusess_id != dosusess_id)
+    return dict(db.session.execute(stmt).all())
+
+
+def insert_timeslots(dosusess_id: int, date_id: int, room: int, slots: list):
+    """
+    Assigns the slots to the dosusess with a single executemany.
+    The dosusess must be flushed already: its after_flush listeners
+    account for the date, as a bulk insert runs none of them
+    """
+    if not slots:
+        return
+    db.session.execute(
+        db.insert(TimeSlot),
+        [
+            {
+                "date_id": date_id,
+                "room": room,
+                "number": number,
+                "dosusess_id": dosusess_id,
+            }
+            for number in slots
+        ],
+    )
+
+
+@with_booking_retry
+def book_dosusess(
+    sess_date: date,
+    room: int,
+    slot: int,
+    dosutype: DosuType,
+    worker_id: int,
+    patient_id: int,
+    note: str = "",
+    is_first: bool = False,
+) -> DosuSess:
+    """
+    Creates an active dosusess and its timeslots in a single transaction.
+    The date is locked and the slots are probed first to report the taken
+    ones, but the unique_timeslot_constraint decides: a booking that gets
+    past the probe anyway is rolled back and reported the same way.
+    The probe reads the occupancy index when it holds the date at its
+    current version, and timeslot_table otherwise or to report a conflict.
+
+    Raises:
+        BookingConflict: if any of the timeslots is taken
+        BookingBusy: if the dates stayed locked by other bookings
+    """
+    slots = range(slot, slot + dosutype.slot_quantity)
+    try:
+        date_id = lock_date(sess_date)
+        version = get_scope_versions(sess_date, sess_date).get(
+            sess_date.isoformat(), 0
+        )
+        bitmap = occupancy_index.peek(sess_date, room, version)
+        if bitmap is None or not is_free(bitmap, slot, dosutype.slot_quantity):
+            taken = find_taken_slots(date_id, room, slots)
+            if taken:
+                raise BookingConflict(sess_date, room, taken)
+
+        dosusess = DosuSess(
+            dosusess_date=sess_date,
+            room=room,
+            slot=slot,
+            dosutype_id=dosutype.id,
+            price=dosutype.price,
+            worker_id=worker_id,
+            patient_id=patient_id,
+            status="active",
+            note=note,
+            is_first=is_first,
+        )
+        db.session.add(dosusess)
+        db.session.flush()
+        insert_timeslots(dosusess.id, date_id, room, list(slots))
+        db.session.commit()
+    except BookingConflict:
+        db.session.rollback()
+        raise
+    except IntegrityError as e:
+        db.session.rollback()
+        if _is_timeslot_conflict(e):
+            raise BookingConflict(sess_date, room) from e
+        raise
+    # the flush of the new dosusess bumped the version of the date once
+    occupancy_index.occupy(sess_date, room, slots, version)
+    return dosusess
+
+
+@with_booking_retry
+def reschedule_dosusess(
+    dosusess_id: int,
+    sess_date: date,
+    room: int,
+    slot: int,
+    dosutype: DosuType,
+    worker_id: int,
+    **changes,
+) -> DosuSess:
+    """
+    Moves the dosusess to the slots starting at (sess_date, room, slot)
+    and applies the other column changes, e.g. the note, in one transaction.
+    Only the difference between the old and the new timeslots is written,
+    with one bulk delete and one bulk insert.
+
+    Raises:
+        BookingConflict: if any of the new timeslots is taken by another dosusess
+        BookingNotFound: if the dosusess was deleted
+        BookingBusy: if the dates stayed locked by other bookings
+    """
+    slots = range(slot, slot + dosutype.slot_quantity)
+    try:
+        # the old date loses its timeslots, so it is locked together with
+        # the new one, in the date order of lock_dates
+        old_date = db.session.scalar(
+            db.select(DosuSess.dosusess_date).filter(DosuSess.id == dosusess_id)
+        )
+        if old_date is None:
+            raise BookingNotFound(dosusess_id)
+        date_id = lock_dates([old_date, sess_date])[sess_date]
+        # read again under the lock, the caller may hold a copy loaded before
+        dosusess = db.session.get(DosuSess, dosusess_id, populate_existing=True)
+        if dosusess is None:
+            raise BookingNotFound(dosusess_id)
+        if dosusess.dosusess_date != old_date:
+            # moved by another reschedule before the lock, a deadlock of this
+            # late lock with another booking is retried by with_booking_retry
+            old_date = dosusess.dosusess_date
+            lock_dates([old_date], create=False)
+        taken = find_taken_slots(date_id, room, slots, dosusess_id)
+        if taken:
+            raise BookingConflict(sess_date, room, taken)
+
+        old = {
+            (ts_date_id, ts_room, number): ts_id
+            for ts_date_id, ts_room, number, ts_id in db.session.execute(
+                db.select(
+                    TimeSlot.date_id, TimeSlot.room, TimeSlot.number, TimeSlot.id
+                ).filter(TimeSlot.dosusess_id == dosusess_id)
+            )
+        }
+        new = {(date_id, room, number) for number in slots}
+        stale_ids = [ts_id for key, ts_id in old.items() if key not in new]
+        if stale_ids:
+            db.session.execute(db.delete(TimeSlot).where(TimeSlot.id.in_(stale_ids)))
+        insert_timeslots(
+            dosusess_id, date_id, room, sorted(key[2] for key in new - old.keys())
+        )
+
+        for key, value in changes.items():
+            setattr(dosusess, key, value)
+        dosusess.dosusess_date = sess_date
+        dosusess.dosutype_id = dosutype.id
+        dosusess.room = room
+        dosusess.slot = slot
+        dosusess.worker_id = worker_id
+        db.session.commit()
+    except (BookingConflict, BookingNotFound):
+        db.session.rollback()
+        raise
+    except StaleDataError as e:
+        # deleted by a writer which doesn't lock the dates
+        db.session.rollback()
+        raise BookingNotFound(dosusess_id) from e
+    except IntegrityError as e:
+        db.session.rollback()
+        if _is_timeslot_conflict(e):
+            raise BookingConflict(sess_date, room) from e
+        raise
+    occupancy_index.invalidate([old_date, sess_date])
+    return dosusess
+
+
+def weekly_dates(
+    start_date: date, weekdays: Iterable[int], weeks: int, interval: int = 1
+) -> list:
+    """
+    Expands a weekly recurrence: the weekdays (0 is monday) of every
+    interval-th week of the weeks from the week of start_date on,
+    skipping the days before start_date
+    """
+    week_start = start_date - timedelta(days=start_date.weekday())
+    return [
+        week_start + timedelta(weeks=week, days=weekday)
+        for week in range(0, weeks, interval)
+        for weekday in sorted(set(weekdays))
+        if week_start + timedelta(weeks=week, days=weekday) >= start_date
+    ]
+
+
+@with_booking_retry
+def book_series(
+    dates: Iterable[date],
+    room: int,
+    slot: int,
+    dosutype: DosuType,
+    worker_id: int,
+    patient_id: int,
+    note: str = "",
+    is_first: bool = False,
+    skip_conflicts: bool = False,
+) -> tuple:
+    """
+    Books the same slots of the room on each of the dates in a single
+    transaction. The taken slots of all the dates are found with one query
+    and reported per date; unless skip_conflicts, any of them cancels the
+    whole series. Only the first occurrence is marked is_first.
+
+    Returns:
+        (id, date) of the created dosusesses,
+        and the BookingConflict of each skipped date
+    Raises:
+        BookingSeriesConflict: if any of the dates is taken
+        BookingBusy: if the dates stayed locked by other bookings
+    """
+    slots = list(range(slot, slot + dosutype.slot_quantity))
+    try:
+        date_ids = lock_dates(dates)
+        taken = {}
+        for date_id, number, dosusess_id in db.session.execute(
+            db.select(TimeSlot.date_id, TimeSlot.number, TimeSlot.dosusess_id).filter(
+                TimeSlot.date_id.in_(date_ids.values()),
+                TimeSlot.room == room,
+                TimeSlot.number.in_(slots),
+            )
+        ):
+            taken.setdefault(date_id, {})[number] = dosusess_id
+        conflicts = [
+            BookingConflict(sess_date, room, taken[date_id])
+            for sess_date, date_id in sorted(date_ids.items())
+            if date_id in taken
+        ]
+        if conflicts and not skip_conflicts:
+            raise BookingSeriesConflict(conflicts)
+
+        free_dates = [
+            sess_date
+            for sess_date, date_id in sorted(date_ids.items())
+            if date_id not in taken
+        ]
+        dosusesses = [
+            DosuSess(
+                dosusess_date=sess_date,
+                room=room,
+                slot=slot,
+                dosutype_id=dosutype.id,
+                price=dosutype.price,
+                worker_id=worker_id,
+                patient_id=patient_id,
+                status="active",
+                note=note,
+                is_first=is_first and index == 0,
+            )
+            for index, sess_date in enumerate(free_dates)
+        ]
+        db.session.add_all(dosusesses)
+        # one flush for the listeners, then one executemany for the timeslots
+        db.session.flush()
+        if dosusesses:
+            db.session.execute(
+                db.insert(TimeSlot),
+                [
+                    {
+                        "date_id": date_ids[dosusess.dosusess_date],
+                        "room": room,
+                        "number": number,
+                        "dosusess_id": dosusess.id,
+                    }
+                    for dosusess in dosusesses
+                    for number in slots
+                ],
+            )
+        # read before the commit expires them
+        created = [(dosusess.id, dosusess.dosusess_date) for dosusess in dosusesses]
+        db.session.commit()
+    except BookingError:
+        db.session.rollback()
+        raise
+    except IntegrityError as e:
+        db.session.rollback()
+        if _is_timeslot_conflict(e):
+            raise BookingSeriesConflict([]) from e
+        raise
+    occupancy_index.invalidate(free_dates)
+    return created, conflicts
+
+
+def working_dates(start_date: date, end_date: date) -> list:
+    """
+    The dates of the range except the sundays
+    """
+    return [
+        start_date + timedelta(days=offset)
+        for offset in range((end_date - start_date).days + 1)
+        if (start_date + timedelta(days=offset)).weekday() != 6
+    ]
+
+
+def get_room_workers(rooms: Iterable[int]) -> dict:
+    """
+    Returns {room: id} of the first available worker of each room,
+    who takes the bookings of the room
+    """
+    room_workers = {}
+    for room, worker_id in db.session.execute(
+        db.select(Worker.room, Worker.id)
+        .filter(Worker.room.in_(set(rooms)), Worker.available == True)
+        .order_by(Worker.id)
+    ):
+        room_workers.setdefault(room, worker_id)
+    return room_workers
+
+
+def get_blocked_patient_id() -> int:
+    patient_id = db.session.scalar(db.select(Patient.id).filter_by(mrn=0))
+    if patient_id is None:
+        raise BookingError("The blocked patient is missing, run flask seed-defaults")
+    return patient_id
+
+
+def _queue_schedule_events(events):
+    # published by publish_schedule_events once committed
+    db.session.info.setdefault("schedule_events", []).extend(events)
+
+
+@with_booking_retry
+def block_slots(
+    dates: Iterable[date],
+    room_workers: dict,
+    slot: int,
+    dosutype: DosuType,
+    skip_conflicts: bool = False,
+) -> tuple:
+    """
+    Books the dosutype, e.g. "off", for the blocked patient in each of the
+    rooms of room_workers on each of the dates, in a single transaction.
+    The sessions and their timeslots are written with one bulk insert each,
+    so the daily summary, the schedule versions and the schedule events,
+    which the flush listeners maintain for ORM writes, are updated here.
+    The taken (date, room) pairs are reported like book_series does.
+
+    Returns:
+        (id, date, room) of the created dosusesses,
+        and the BookingConflict of each skipped (date, room)
+    Raises:
+        BookingSeriesConflict: if any of the (date, room) pairs is taken
+        BookingBusy: if the dates stayed locked by other bookings
+    """
+    slots = list(range(slot, slot + dosutype.slot_quantity))
+    try:
+        patient_id = get_blocked_patient_id()
+        date_ids = lock_dates(dates)
+        taken = {}
+        for date_id, room, number, dosusess_id in db.session.execute(
+            db.select(
+                TimeSlot.date_id, TimeSlot.room, TimeSlot.number, TimeSlot.dosusess_id
+            ).filter(
+                TimeSlot.date_id.in_(date_ids.values()),
+                TimeSlot.room.in_(room_workers),
+                TimeSlot.number.in_(slots),
+            )
+        ):
+            taken.setdefault((date_id, room), {})[number] = dosusess_id
+        cells = [
+            (sess_date, room)
+            for sess_date in sorted(date_ids)
+            for room in sorted(room_workers)
+        ]
+        conflicts = [
+            BookingConflict(sess_date, room, taken[(date_ids[sess_date], room)])
+            for sess_date, room in cells
+            if (date_ids[sess_date], room) in taken
+        ]
+        if conflicts and not skip_conflicts:
+            raise BookingSeriesConflict(conflicts)
+
+        cells = [
+            (sess_date, room)
+            for sess_date, room in cells
+            if (date_ids[sess_date], room) not in taken
+        ]
+        created = []
+        if cells:
+            # the ids come back with their (date, room), in any order
+            created = db.session.execute(
+                db.insert(DosuSess).returning(
+                    DosuSess.id, DosuSess.dosusess_date, DosuSess.room
+                ),
+                [
+                    {
+                        "dosusess_date": sess_date,
+                        "room": room,
+                        "slot": slot,
+                        "dosutype_id": dosutype.id,
+                        "price": dosutype.price,
+                        "worker_id": room_workers[room],
+                        "patient_id": patient_id,
+                        "status": "active",
+                        "note": "",
+                        "is_first": False,
+                    }
+                    for sess_date, room in cells
+                ],
+            ).all()
+            db.session.execute(
+                db.insert(TimeSlot),
+                [
+                    {
+                        "date_id": date_ids[sess_date],
+                        "room": room,
+                        "number": number,
+                        "dosusess_id": dosusess_id,
+                    }
+                    for dosusess_id, sess_date, room in created
+                    for number in slots
+                ],
+            )
+
+            connection = db.session.connection()
+            deltas = {}
+            for _, sess_date, room in created:
+                key = (sess_date, room_workers[room], dosutype.id, "active", True)
+                delta = deltas.setdefault(key, [0, 0])
+                delta[0] += 1
+                delta[1] += dosutype.price or 0
+            apply_daily_summary_deltas(connection, deltas)
+            bump_schedule_versions(connection, {sess_date for sess_date, _ in cells})
+            _queue_schedule_events(
+                {
+                    "type": "create",
+                    "id": dosusess_id,
+                    "date": sess_date.isoformat(),
+                    "room": room,
+                    "slot": slot,
+                    "status": "active",
+                }
+                for dosusess_id, sess_date, room in created
+            )
+        created = [tuple(row) for row in created]
+        db.session.commit()
+    except BookingError:
+        db.session.rollback()
+        raise
+    except IntegrityError as e:
+        db.session.rollback()
+        if _is_timeslot_conflict(e):
+            raise BookingSeriesConflict([]) from e
+        raise
+    occupancy_index.invalidate(sess_date for sess_date, _ in cells)
+    return created, conflicts
+
+
+@with_booking_retry
+def unblock_slots(
+    start_date: date,
+    end_date: date,
+    rooms: Iterable[int],
+    dosutype: DosuType = None,
+) -> list:
+    """
+    Deletes the dosusesses of the blocked patient in the rooms and the date
+    range, only those of the dosutype if given, with their timeslots, in
+    bulk. The bookkeeping of the flush listeners is done here as well.
+
+    Returns:
+        (id, date, room) of the deleted dosusesses
+
+    Raises:
+        BookingBusy: if the dates stayed locked by other bookings
+    """
+    # a date without its DateTable row has no timeslots to unblock,
+    # so the missing ones aren't created
+    lock_dates(
+        (
+            start_date + timedelta(days=offset)
+            for offset in range((end_date - start_date).days + 1)
+        ),
+        create=False,
+    )
+    stmt = (
+        db.select(
+            DosuSess.id,
+            DosuSess.dosusess_date,
+            DosuSess.room,
+            DosuSess.slot,
+            DosuSess.status,
+            DosuSess.worker_id,
+            DosuSess.dosutype_id,
+            DosuSess.price,
+        )
+        .join(DosuSess.patient)
+        .filter(
+            Patient.mrn == 0,
+            DosuSess.room.in_(set(rooms)),
+            DosuSess.dosusess_date.between(start_date, end_date),
+        )
+    )
+    if dosutype is not None:
+        stmt = stmt.filter(DosuSess.dosutype_id == dosutype.id)
+    rows = db.session.execute(stmt).all()
+    if not rows:
+        # releases the locks of the dates
+        db.session.rollback()
+        return []
+
+    ids = [row.id for row in rows]
+    db.session.execute(
+        db.delete(TimeSlot)
+        .where(TimeSlot.dosusess_id.in_(ids))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        db.delete(DosuSess)
+        .where(DosuSess.id.in_(ids))
+        .execution_options(synchronize_session=False)
+    )
+
+    connection = db.session.connection()
+    deltas = {}
+    for row in rows:
+        key = (row.dosusess_date, row.worker_id, row.dosutype_id, row.status, True)
+        delta = deltas.setdefault(key, [0, 0])
+        delta[0] -= 1
+        delta[1] -= row.price or 0
+    apply_daily_summary_deltas(connection, deltas)
+    bump_schedule_versions(connection, {row.dosusess_date for row in rows})
+    record_dosusess_tombstones(
+        connection, [(row.id, row.dosusess_date) for row in rows]
+    )
+    _queue_schedule_events(
+        {
+            "type": "delete",
+            "id": row.id,
+            "date": row.dosusess_date.isoformat(),
+            "room": row.room,
+            "slot": row.slot,
+            "status": row.status,
+        }
+        for row in rows
+    )
+    db.session.commit()
+    occupancy_index.invalidate({row.dosusess_date for row in rows})
+    return [(row.id, row.dosusess_date, row.room) for row in rows]
@@ -0,0 +1,122 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+from importlib import import_module
+
+# the values of session["status_filter"]
+STATUS_FILTERS = ("active", "canceled", "noshow")
+
+
+class LocalCacheBackend:
+    """
+    Thread-safe in-process LRU cache.
+    A shared backend (e.g. a wrapper around a redis client) can replace it
+    through the SCHEDULE_CACHE_BACKEND setting, as long as it provides
+    the same get/set/delete_many/clear methods with string keys
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ScheduleCache:
+    """
+    Caches the formatted sessions of a day per (date, status_filter).
+    Each entry is stamped with the schedule versions it was built from,
+    so an entry changed by another process is never served
+    """
+
+    def __init__(self):
+        self.backend = LocalCacheBackend()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        backend = app.config.get("SCHEDULE_CACHE_BACKEND")
+        if backend:
+            # "package.module:ClassName"
+            module_name, class_name = backend.split(":")
+            self.backend = getattr(import_module(module_name), class_name)(app)
+        else:
+            self.backend = LocalCacheBackend(app.config.get("SCHEDULE_CACHE_SIZE", 512))
+
+    @staticmethod
+    def _key(sess_date: date, status_filter: str) -> str:
+        return f"schedule:{sess_date.isoformat()}:{status_filter}"
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, sess_date: date, status_filter: str, version: tuple):
+        """
+        Returns the cached day schedule, or None if it is missing or
+        was built from other versions than the given one
+        """
+        entry = self.backend.get(self._key(sess_date, status_filter))
+        if entry is not None and tuple(entry[0]) == tuple(version):
+            self._count("hits")
+            return entry[1]
+        self._count("misses")
+        return None
+
+    def set(self, sess_date: date, status_filter: str, version: tuple, schedule):
+        self.backend.set(self._key(sess_date, status_filter), (version, schedule))
+
+    def invalidate(self, dates):
+        """
+        Drops the cached schedules of the dates for all the status filters
+        """
+        keys = [
+            self._key(sess_date, status_filter)
+            for sess_date in set(dates)
+            if sess_date is not None
+            for status_filter in STATUS_FILTERS
+        ]
+        self.backend.delete_many(keys)
+        with self._lock:
+            self.invalidations += len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "invalidations": self.invalidations,
+                "backend": type(self.backend).__name__,
+            }
+
+
+schedule_cache = ScheduleCache()
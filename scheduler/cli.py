@@ -0,0 +1,176 @@
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from scheduler import check_database_connection, db
+from scheduler.booking import (
+    BookingError,
+    BookingSeriesConflict,
+    block_slots,
+    get_room_workers,
+    unblock_slots,
+    working_dates,
+)
+from scheduler.defaults import create_defaults
+from scheduler.models import (
+    DOSUSESS_TOMBSTONE_RETENTION,
+    DosuType,
+    prune_dosusess_tombstones,
+    rebuild_daily_summary,
+)
+
+
+@click.command("init-db")
+@with_appcontext
+def init_db_command():
+    """Check the database connection and create the missing tables.
+
+    Run it once per deployment, before `flask db upgrade` and `flask seed-defaults`.
+    """
+    check_database_connection(current_app)
+    db.create_all()
+    click.echo("Created the missing tables")
+
+
+@click.command("seed-defaults")
+@with_appcontext
+def seed_defaults_command():
+    """Create the admin user, the blocked patient and the off dosutypes."""
+    create_defaults()
+    click.echo("Created the missing default records")
+
+
+@click.command("rebuild-daily-summary")
+@click.option(
+    "--start-date",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="First day to rebuild (YYYY-MM-DD). Defaults to the whole table.",
+)
+@click.option(
+    "--end-date",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="Last day to rebuild (YYYY-MM-DD). Defaults to the whole table.",
+)
+@with_appcontext
+def rebuild_daily_summary_command(start_date, end_date):
+    """Recompute the daily summary table from the dosu sessions."""
+    rows = rebuild_daily_summary(
+        start_date.date() if start_date else None,
+        end_date.date() if end_date else None,
+    )
+    current_app.logger.info(f"Rebuilt daily summary: {rows} rows")
+    click.echo(f"Rebuilt daily summary: {rows} rows")
+
+
+@click.command("prune-dosusess-tombstones")
+@click.option(
+    "--days",
+    type=int,
+    default=DOSUSESS_TOMBSTONE_RETENTION.days,
+    show_default=True,
+    help="Keep the tombstones of the last N days.",
+)
+@with_appcontext
+def prune_dosusess_tombstones_command(days):
+    """Delete the old dosusess tombstones used by the schedule delta API."""
+    rows = prune_dosusess_tombstones(datetime.now() - timedelta(days=days))
+    current_app.logger.info(f"Pruned dosusess tombstones: {rows} rows")
+    click.echo(f"Pruned dosusess tombstones: {rows} rows")
+
+
+@click.command("block-slots")
+@click.option(
+    "--start-date",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    required=True,
+    help="First day to block (YYYY-MM-DD).",
+)
+@click.option(
+    "--end-date",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    required=True,
+    help="Last day to block (YYYY-MM-DD). Sundays are skipped.",
+)
+@click.option("--room", "rooms", type=int, multiple=True, required=True)
+@click.option("--dosutype-id", type=int, required=True, help="e.g. the off dosutype")
+@click.option("--slot", type=int, default=0, show_default=True)
+@click.option(
+    "--skip-conflicts",
+    is_flag=True,
+    help="Block the free room days only, instead of nothing if any is taken.",
+)
+@with_appcontext
+def block_slots_command(start_date, end_date, rooms, dosutype_id, slot, skip_conflicts):
+    """Book a dosutype for the blocked patient in the rooms over a date range."""
+    dosutype = db.session.get(DosuType, dosutype_id)
+    if dosutype is None:
+        raise click.ClickException(f"Dosutype {dosutype_id} not found")
+    room_workers = get_room_workers(rooms)
+    missing = sorted(set(rooms) - room_workers.keys())
+    if missing:
+        raise click.ClickException(f"No available worker in the rooms {missing}")
+
+    try:
+        created, conflicts = block_slots(
+            working_dates(start_date.date(), end_date.date()),
+            room_workers,
+            slot,
+            dosutype,
+            skip_conflicts=skip_conflicts,
+        )
+    except BookingSeriesConflict as e:
+        for conflict in e.conflicts:
+            click.echo(f"Taken: {conflict}")
+        raise click.ClickException(str(e))
+    except BookingError as e:
+        raise click.ClickException(str(e))
+    for conflict in conflicts:
+        click.echo(f"Skipped: {conflict}")
+    current_app.logger.info(f"Blocked {len(created)} room days")
+    click.echo(f"Blocked {len(created)} room days, skipped {len(conflicts)}")
+
+
+@click.command("unblock-slots")
+@click.option(
+    "--start-date",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    required=True,
+    help="First day to unblock (YYYY-MM-DD).",
+)
+@click.option(
+    "--end-date",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    required=True,
+    help="Last day to unblock (YYYY-MM-DD).",
+)
+@click.option("--room", "rooms", type=int, multiple=True, required=True)
+@click.option(
+    "--dosutype-id",
+    type=int,
+    help="Unblock only the sessions of the dosutype. Defaults to all of them.",
+)
+@with_appcontext
+def unblock_slots_command(start_date, end_date, rooms, dosutype_id):
+    """Delete the sessions of the blocked patient in the rooms over a date range."""
+    dosutype = None
+    if dosutype_id is not None:
+        dosutype = db.session.get(DosuType, dosutype_id)
+        if dosutype is None:
+            raise click.ClickException(f"Dosutype {dosutype_id} not found")
+    try:
+        deleted = unblock_slots(start_date.date(), end_date.date(), rooms, dosutype)
+    except BookingError as e:
+        raise click.ClickException(str(e))
+    current_app.logger.info(f"Unblocked {len(deleted)} room days")
+    click.echo(f"Unblocked {len(deleted)} room days")
+
+
+def init_app(app):
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_defaults_command)
+    app.cli.add_command(rebuild_daily_summary_command)
+    app.cli.add_command(prune_dosusess_tombstones_command)
+    app.cli.add_command(block_slots_command)
+    app.cli.add_command(unblock_slots_command)
@@ -0,0 +1,228 @@
+import json
+import queue
+import threading
+from datetime import date
+from importlib import import_module
+from time import sleep
+
+
+class LocalBroker:
+    """
+    Delivers the published events to the subscribers of this process only.
+    A broker reaching the other worker processes (e.g. redis pub/sub) can
+    replace it through the SCHEDULE_EVENT_BROKER setting: it is built with
+    (app, dispatch), publishes the event lists with publish(events) and calls
+    dispatch(events) in every process for the events it receives
+    """
+
+    def __init__(self, app=None, dispatch=None):
+        self.dispatch = dispatch
+
+    def publish(self, events):
+        self.dispatch(events)
+
+
+class Subscription:
+    """
+    Queue of the events of a date range for a single stream.
+    When the client is too slow and the queue fills up, the pending events
+    are replaced with a single "reset" event asking for a full reload
+    """
+
+    def __init__(self, bus, start_date: date, end_date: date, maxsize=100):
+        self.bus = bus
+        self.start_date = start_date.isoformat()
+        self.end_date = end_date.isoformat()
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def matches(self, event) -> bool:
+        return any(
+            self.start_date <= event[key] <= self.end_date
+            for key in ("date", "old_date")
+            if event.get(key)
+        )
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put_nowait({"type": "reset"})
+
+    def get(self, timeout=None):
+        """
+        Returns the next event, or None if none came within the timeout
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.discard(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class VersionPoller:
+    """
+    Polls the schedule versions of the subscribed dates for the whole process,
+    so the changes committed by the other worker processes reach the streams
+    as a reset when the broker only reaches this process. The dates of the
+    events dispatched since the last poll are left out, their subscribers
+    already got the events. The thread stops when the last stream closes
+    """
+
+    def __init__(self, app, bus, interval=5):
+        self.app = app
+        self.bus = bus
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+        self._dispatched = set()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="schedule-version-poller", daemon=True
+                )
+                self._thread.start()
+
+    def dispatched(self, events):
+        with self._lock:
+            self._dispatched.update(
+                event[key] for event in events for key in ("date", "old_date")
+                if event.get(key)
+            )
+
+    def _run(self):
+        # models imports this module
+        from scheduler.models import REFERENCE_SCOPE, get_scope_versions
+
+        versions = polled = None
+        while True:
+            with self._lock:
+                subscriptions = self.bus.subscriptions()
+                # the poller of an app the bus was set up for again stops too
+                if not subscriptions or self.bus.poller is not self:
+                    self._thread = None
+                    return
+                dispatched, self._dispatched = self._dispatched, set()
+            start_date = min(subscription.start_date for subscription in subscriptions)
+            end_date = max(subscription.end_date for subscription in subscriptions)
+            try:
+                with self.app.app_context():
+                    current = get_scope_versions(
+                        date.fromisoformat(start_date), date.fromisoformat(end_date)
+                    )
+            except Exception:
+                self.app.logger.exception("Polling the schedule versions failed")
+            else:
+                if polled:
+                    # the dates outside the range polled before, e.g. of a new
+                    # stream, have no previous version
+                    first, last = polled
+                    changed = {
+                        scope
+                        for scope, version in current.items()
+                        if version != versions.get(scope, 0)
+                        and (scope == REFERENCE_SCOPE or first <= scope <= last)
+                    }
+                    self.reset(subscriptions, changed - dispatched, REFERENCE_SCOPE)
+                versions, polled = current, (start_date, end_date)
+            sleep(self.interval)
+
+    @staticmethod
+    def reset(subscriptions, scopes, reference_scope):
+        for subscription in subscriptions:
+            if reference_scope in scopes or any(
+                subscription.matches({"date": scope}) for scope in scopes
+            ):
+                subscription.put({"type": "reset"})
+
+
+class ScheduleEventBus:
+    """
+    Publishes the dosusess changes to the schedule streams.
+    The events are plain dicts with a "type" (create, update, status, delete)
+    and the id, date and old date of the dosusess
+    """
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self.broker = LocalBroker(dispatch=self.dispatch)
+        self.poller = None
+        self.max_subscriptions = None
+
+    def init_app(self, app):
+        broker = app.config.get("SCHEDULE_EVENT_BROKER")
+        if broker:
+            # "package.module:ClassName"
+            module_name, class_name = broker.split(":")
+            broker_class = getattr(import_module(module_name), class_name)
+            self.broker = broker_class(app, self.dispatch)
+            self.poller = None
+        else:
+            self.broker = LocalBroker(app, self.dispatch)
+            self.poller = VersionPoller(
+                app, self, app.config.get("SCHEDULE_STREAM_POLL", 5)
+            )
+        self.max_subscriptions = app.config.get("SCHEDULE_STREAM_MAX")
+
+    def subscribe(self, start_date: date, end_date: date):
+        """
+        Returns the subscription to the events of the date range,
+        or None if this process already has max_subscriptions streams
+        """
+        subscription = Subscription(self, start_date, end_date)
+        with self._lock:
+            if (
+                self.max_subscriptions is not None
+                and len(self._subscriptions) >= self.max_subscriptions
+            ):
+                return None
+            self._subscriptions.add(subscription)
+        if self.poller is not None:
+            self.poller.start()
+        return subscription
+
+    def subscriptions(self) -> list:
+        with self._lock:
+            return list(self._subscriptions)
+
+    def discard(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, events):
+        if events:
+            self.broker.publish(events)
+
+    def dispatch(self, events):
+        if self.poller is not None:
+            self.poller.dispatched(events)
+        subscriptions = self.subscriptions()
+        for event in events:
+            for subscription in subscriptions:
+                if subscription.matches(event):
+                    subscription.put(event)
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+
+def format_sse(event) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+schedule_events = ScheduleEventBus()
@@ -1,20 +1,26 @@
 # models.py
 from datetime import date, datetime, time, timedelta
+from functools import lru_cache, partial
+from itertools import islice
+from types import MappingProxyType
 from typing import List, Optional
 
-from flask import session
+from flask import g, session
 from sqlalchemy import (
     Boolean,
     Date,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
     Time,
     UniqueConstraint,
     and_,
+    case,
     event,
+    inspect,
     or_,
     func,
 )
@@ -22,7 +28,10 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
 
 from scheduler import db
+from scheduler.cache import schedule_cache
+from scheduler.events import schedule_events
 from scheduler.custom_filters import format_kr_date
+from scheduler.utils import month_range
 
 
 class Worker(db.Model):
@@ -39,6 +48,9 @@ class Worker(db.Model):
         back_populates="worker", cascade="all, delete-orphan"
     )
 
+    # to look up the first available worker of a room
+    __table_args__ = (Index("ix_worker_table_room_available", "room", "available"),)
+
     def __repr__(self) -> str:
         return f"Worker(id={self.id!r}, name={self.name!r})"
 
@@ -130,63 +142,79 @@ class Patient(db.Model):
     def get_status_counts(
         self, start_date: date = date(1900, 1, 1), end_date: date = date(2999, 12, 31)
     ) -> dict:
-        # Initialize dictionary to store counts
+        """Get counts of sessions by status and the amount of the active ones"""
+        results = db.session.execute(
+            db.select(
+                DosuSess.status,
+                func.count(DosuSess.id).label("count"),
+                func.sum(DosuSess.price).label("amount"),
+            )
+            .filter(
+                DosuSess.patient_id == self.id,
+                DosuSess.dosusess_date.between(start_date, end_date),
+            )
+            .group_by(DosuSess.status)
+        ).all()
+
         status_counts = {"total_amount": 0}
-        # Iterate through all dosusess for this patient
-        for dosusess in self.dosusess_set:
-            if start_date <= dosusess.dosusess_date <= end_date:
-                status = dosusess.status
-                status_counts[status] = status_counts.get(status, 0) + 1
-                if status == "active":
-                    status_counts["total_amount"] += dosusess.price
+        for status, count, amount in results:
+            status_counts[status] = count
+            if status == "active":
+                status_counts["total_amount"] = amount or 0
 
         return dict(sorted(status_counts.items()))  # sort by keys
 
     def get_dosutype_counts(
         self, start_date: date = date(1900, 1, 1), end_date: date = date(2999, 12, 31)
     ) -> dict:
-        # def get_dosutype_counts(self, start_date: date, end_date: date) -> dict:
-        # Initialize dictionary to store counts
+        """Get counts of sessions by dosutype name and status"""
+        results = db.session.execute(
+            db.select(
+                DosuType.name,
+                DosuSess.status,
+                func.count(DosuSess.id).label("count"),
+            )
+            .join(DosuSess.dosutype)
+            .filter(
+                DosuSess.patient_id == self.id,
+                DosuSess.dosusess_date.between(start_date, end_date),
+            )
+            .group_by(DosuType.name, DosuSess.status)
+        ).all()
+
+        # sorted by dosutype name and then by status
         dosutype_counts = {}
-        # Iterate through all dosusess for this patient
-        for dosusess in self.dosusess_set:
-            if start_date <= dosusess.dosusess_date <= end_date:
-                dosutype_name = dosusess.dosutype.name
-                status = dosusess.status
-                dosutype_counts.setdefault(dosutype_name, {}).setdefault(status, 0)
-                dosutype_counts[dosutype_name][status] += 1
-        # Sorting
-        return_dict = {}
-        # sorted by worker_id
-        for dt_name, status_dict in sorted(dosutype_counts.items()):
-            # sorted by status
-            sorted_status = dict(sorted(status_dict.items()))
-            return_dict[dt_name] = sorted_status
-
-        return return_dict
+        for dt_name, status, count in sorted(results):
+            dosutype_counts.setdefault(dt_name, {})[status] = count
+        return dosutype_counts
 
     def get_worker_counts(
         self, start_date: date = date(1900, 1, 1), end_date: date = date(2999, 12, 31)
     ) -> dict:
-        # Initialize dictionary to store counts
-        worker_counts = {}
-        # Iterate through all dosusess for this patient
-        for dosusess in self.dosusess_set:
-            if start_date <= dosusess.dosusess_date <= end_date:
-                worker_id = dosusess.worker_id
-                status = dosusess.status
-                worker_counts.setdefault(worker_id, {}).setdefault(status, 0)
-                worker_counts[worker_id][status] += 1
-
-        # Sorting
-        return_dict = {}
-        # sorted by worker_id
-        for w_id, status_dict in sorted(worker_counts.items()):
-            # sorted by status
-            sorted_status = dict(sorted(status_dict.items()))
-            return_dict[w_id] = sorted_status
+        """
+        Get counts of sessions by worker and status,
+        keyed by (worker_id, worker_name)
+        """
+        results = db.session.execute(
+            db.select(
+                Worker.id,
+                Worker.name,
+                DosuSess.status,
+                func.count(DosuSess.id).label("count"),
+            )
+            .join(DosuSess.worker)
+            .filter(
+                DosuSess.patient_id == self.id,
+                DosuSess.dosusess_date.between(start_date, end_date),
+            )
+            .group_by(Worker.id, Worker.name, DosuSess.status)
+        ).all()
 
-        return return_dict
+        # sorted by worker_id and then by status
+        worker_counts = {}
+        for worker_id, worker_name, status, count in sorted(results):
+            worker_counts.setdefault((worker_id, worker_name), {})[status] = count
+        return worker_counts
 
 
 class DosuType(db.Model):
@@ -231,6 +259,57 @@ class DateTable(db.Model):
         return f"Date(id={self.id!r}, date={self.date!r})"
 
 
+def iter_slot_times(
+    start_hour: time,
+    duration: int,
+    lunch_start_hour: Optional[time] = None,
+    lunch_end_hour: Optional[time] = None,
+):
+    """
+    Yields the start time of each slot from the start hour on,
+    skipping the lunch break the same way the daily table does
+    """
+    slot_hour = datetime.combine(date.min, start_hour)
+    step = timedelta(minutes=duration)
+    while True:
+        if lunch_start_hour and lunch_start_hour <= slot_hour.time() < lunch_end_hour:
+            slot_hour = datetime.combine(date.min, lunch_end_hour)
+            continue
+        yield slot_hour.time()
+        slot_hour += step
+
+
+@lru_cache(maxsize=64)
+def compile_slot_table(
+    start_hour: time,
+    end_hour: time,
+    duration: int,
+    lunch_start_hour: Optional[time] = None,
+    lunch_end_hour: Optional[time] = None,
+) -> tuple:
+    """
+    Slot number -> "HH:MM" label of a working day.
+    Cached by the hours, so a modified config compiles into a new table
+    """
+    labels = []
+    for slot_hour in iter_slot_times(
+        start_hour, duration, lunch_start_hour, lunch_end_hour
+    ):
+        if slot_hour >= end_hour or (labels and slot_hour <= start_hour):
+            # the latter stops the walk when it wraps around midnight
+            break
+        labels.append(slot_hour.strftime("%H:%M"))
+    return tuple(labels)
+
+
+@lru_cache(maxsize=64)
+def compile_slot_index(slot_table: tuple) -> MappingProxyType:
+    """
+    "HH:MM" label -> slot number, the reverse of compile_slot_table
+    """
+    return MappingProxyType({label: slot for slot, label in enumerate(slot_table)})
+
+
 class TimeSlotConfig(db.Model):
     __tablename__ = "timeslot_config_table"
 
@@ -263,6 +342,45 @@ class TimeSlotConfig(db.Model):
 
         return is_default_value
 
+    def slot_table(self, is_saturday: bool = False) -> tuple:
+        """
+        Immutable slot number -> "HH:MM" label table of a weekday or a saturday
+        """
+        if is_saturday:
+            return compile_slot_table(
+                self.sd_start_hour, self.sd_end_hour, self.duration
+            )
+        return compile_slot_table(
+            self.wd_start_hour,
+            self.wd_end_hour,
+            self.duration,
+            self.wd_lunch_start_hour,
+            self.wd_lunch_end_hour,
+        )
+
+    def slot_index(self, is_saturday: bool = False) -> MappingProxyType:
+        """
+        Immutable "HH:MM" label -> slot number mapping of a weekday or a saturday
+        """
+        return compile_slot_index(self.slot_table(is_saturday))
+
+    def slot_label(self, slot: int, is_saturday: bool = False) -> str:
+        table = self.slot_table(is_saturday)
+        if 0 <= slot < len(table):
+            return table[slot]
+
+        # out of the working hours, e.g. the hours were changed after booking
+        if is_saturday:
+            slot_times = iter_slot_times(self.sd_start_hour, self.duration)
+        else:
+            slot_times = iter_slot_times(
+                self.wd_start_hour,
+                self.duration,
+                self.wd_lunch_start_hour,
+                self.wd_lunch_end_hour,
+            )
+        return next(islice(slot_times, max(slot, 0), None)).strftime("%H:%M")
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -277,6 +395,8 @@ class TimeSlotConfig(db.Model):
             "sd_end_hour": self.sd_end_hour.strftime("%H:%M"),
             "sd_overtime_hour": self.sd_overtime_hour.strftime("%H:%M"),
             "duration": self.duration,
+            "wd_slots": list(self.slot_table(is_saturday=False)),
+            "sd_slots": list(self.slot_table(is_saturday=True)),
         }
 
     def __repr__(self):
@@ -304,6 +424,7 @@ class TimeSlot(db.Model):
         UniqueConstraint(
             "date_id", "room", "number", name="unique_timeslot_constraint"
         ),
+        Index("ix_timeslot_table_dosusess_id", "dosusess_id"),
     )
 
     def __repr__(self):
@@ -337,6 +458,24 @@ class DosuSess(db.Model):
         back_populates="dosusess", cascade="all, delete-orphan"
     )
 
+    # schedules and stats always filter on a date range, often combined
+    # with a worker, a patient or a status
+    __table_args__ = (
+        Index(
+            "ix_dosu_session_table_dosusess_date_status", "dosusess_date", "status"
+        ),
+        Index(
+            "ix_dosu_session_table_worker_id_dosusess_date",
+            "worker_id",
+            "dosusess_date",
+        ),
+        Index(
+            "ix_dosu_session_table_patient_id_dosusess_date",
+            "patient_id",
+            "dosusess_date",
+        ),
+    )
+
     def __repr__(self) -> str:
         return f"DosuSess(id={self.id!r}, date={self.dosusess_date!r}, status={self.status!r})"
 
@@ -348,6 +487,528 @@ def dosusess_status_listener(target, value, oldvalue, initiator):
         target.timeslot_set = []
 
 
+class DailySummary(db.Model):
+    # Session counts and amounts per day, worker, dosutype and status.
+    # It is derived from dosu_session_table and kept up to date by
+    # daily_summary_listener; rebuild it with "flask rebuild-daily-summary".
+    # No foreign keys, so that deleting a worker or a dosutype doesn't depend
+    # on the order in which the summary rows are adjusted.
+    __tablename__ = "daily_summary_table"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    summary_date: Mapped[date] = mapped_column(Date)
+    worker_id: Mapped[int] = mapped_column(Integer)
+    dosutype_id: Mapped[int] = mapped_column(Integer)
+    status: Mapped[str] = mapped_column(String)
+    # sessions of the blocked patient (mrn 0), which most stats exclude
+    blocked: Mapped[bool] = mapped_column(Boolean, default=False)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+    amount: Mapped[int] = mapped_column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "summary_date",
+            "worker_id",
+            "dosutype_id",
+            "status",
+            "blocked",
+            name="unique_daily_summary_constraint",
+        ),
+    )
+
+    def __repr__(self):
+        return f"DailySummary(date={self.summary_date!r}, worker_id={self.worker_id!r}, status={self.status!r}, count={self.count!r})"
+
+
+def dialect_insert(connection):
+    """
+    insert() of the connection's dialect, which supports on_conflict_do_update
+    """
+    if connection.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+DAILY_SUMMARY_KEYS = ("summary_date", "worker_id", "dosutype_id", "status", "blocked")
+
+
+def _committed_value(state, key):
+    # the value before the flush
+    hist = state.attrs[key].history
+    if hist.deleted:
+        return hist.deleted[0]
+    if hist.unchanged:
+        return hist.unchanged[0]
+    return getattr(state.obj(), key)
+
+
+def _summary_key(value, blocked_patient_ids):
+    # value(attr) returns an attribute of the DosuSess
+    return (
+        value("dosusess_date"),
+        value("worker_id"),
+        value("dosutype_id"),
+        value("status"),
+        value("patient_id") in blocked_patient_ids,
+    )
+
+
+def apply_daily_summary_deltas(connection, deltas: dict):
+    """
+    Adds the (count, amount) deltas to the daily summary rows of the keys
+    with an upsert, then removes the rows whose count dropped to zero.
+    The keys are tuples of DAILY_SUMMARY_KEYS
+    """
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+
+    insert = dialect_insert(connection)
+    table = DailySummary.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(DAILY_SUMMARY_KEYS),
+        set_={
+            "count": table.c["count"] + stmt.excluded["count"],
+            "amount": table.c["amount"] + stmt.excluded["amount"],
+        },
+    )
+    connection.execute(
+        stmt,
+        [
+            dict(zip(DAILY_SUMMARY_KEYS, key), count=count, amount=amount)
+            for key, (count, amount) in deltas.items()
+        ],
+    )
+    connection.execute(
+        db.delete(table).where(
+            table.c["count"] <= 0,
+            table.c.summary_date.in_({key[0] for key in deltas}),
+        )
+    )
+
+
+@event.listens_for(db.session, "after_flush")
+def daily_summary_listener(session, flush_context):
+    """
+    Adjusts the daily summary by the DosuSess rows inserted, updated
+    and deleted in the flush
+    """
+    states = []
+    for obj in session.new:
+        if isinstance(obj, DosuSess):
+            states.append((None, obj))
+    for obj in session.dirty:
+        if isinstance(obj, DosuSess) and session.is_modified(obj):
+            states.append((obj, obj))
+    for obj in session.deleted:
+        if isinstance(obj, DosuSess):
+            states.append((obj, None))
+    if not states:
+        return
+
+    connection = session.connection()
+    blocked_patient_ids = set(
+        connection.execute(db.select(Patient.id).filter(Patient.mrn == 0)).scalars()
+    )
+
+    deltas = {}
+    for old, new in states:
+        if old is not None:
+            old_value = partial(_committed_value, inspect(old))
+            key = _summary_key(old_value, blocked_patient_ids)
+            delta = deltas.setdefault(key, [0, 0])
+            delta[0] -= 1
+            delta[1] -= old_value("price") or 0
+        if new is not None:
+            new_value = partial(getattr, new)
+            key = _summary_key(new_value, blocked_patient_ids)
+            delta = deltas.setdefault(key, [0, 0])
+            delta[0] += 1
+            delta[1] += new_value("price") or 0
+
+    apply_daily_summary_deltas(connection, deltas)
+
+
+def rebuild_daily_summary(start_date: date = None, end_date: date = None):
+    """
+    Recomputes the daily summary from dosu_session_table,
+    for the whole table or for a date range
+    """
+    table = DailySummary.__table__
+    delete_stmt = db.delete(table)
+    select_stmt = (
+        db.select(
+            DosuSess.dosusess_date,
+            DosuSess.worker_id,
+            DosuSess.dosutype_id,
+            DosuSess.status,
+            case((Patient.mrn == 0, True), else_=False),
+            func.count(DosuSess.id),
+            func.coalesce(func.sum(DosuSess.price), 0),
+        )
+        .join(Patient, DosuSess.patient_id == Patient.id)
+        .group_by(
+            DosuSess.dosusess_date,
+            DosuSess.worker_id,
+            DosuSess.dosutype_id,
+            DosuSess.status,
+            Patient.mrn == 0,
+        )
+    )
+    if start_date is not None:
+        delete_stmt = delete_stmt.where(table.c.summary_date >= start_date)
+        select_stmt = select_stmt.where(DosuSess.dosusess_date >= start_date)
+    if end_date is not None:
+        delete_stmt = delete_stmt.where(table.c.summary_date <= end_date)
+        select_stmt = select_stmt.where(DosuSess.dosusess_date <= end_date)
+
+    db.session.execute(delete_stmt)
+    result = db.session.execute(
+        table.insert().from_select(
+            list(DAILY_SUMMARY_KEYS) + ["count", "amount"], select_stmt
+        )
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+class ScheduleVersion(db.Model):
+    # Change counter of the schedule per date, bumped by schedule_version_listener
+    # whenever a DosuSess or a TimeSlot of the date changes. The "reference" scope
+    # counts the changes of patients, workers, dosutypes and timeslot configs,
+    # whose details are part of the schedule as well.
+    __tablename__ = "schedule_version_table"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    scope: Mapped[str] = mapped_column(String, unique=True)  # "YYYY-MM-DD"
+    version: Mapped[int] = mapped_column(Integer, default=0)
+
+    def __repr__(self):
+        return f"ScheduleVersion(scope={self.scope!r}, version={self.version!r})"
+
+
+REFERENCE_SCOPE = "reference"
+
+
+def bump_schedule_versions(connection, scopes):
+    """
+    Increments the versions of the scopes, which are dates or REFERENCE_SCOPE
+    """
+    scopes = {
+        scope.isoformat() if isinstance(scope, date) else scope for scope in scopes
+    }
+    if not scopes:
+        return
+
+    table = ScheduleVersion.__table__
+    stmt = dialect_insert(connection)(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["scope"],
+        set_={"version": table.c.version + 1},
+    )
+    connection.execute(stmt, [{"scope": scope, "version": 1} for scope in scopes])
+
+
+def get_scope_versions(start_date: date, end_date: date) -> dict:
+    """
+    Returns {scope: version} of the dates in the range and of REFERENCE_SCOPE.
+    Scopes that never changed are missing, i.e. version 0
+    """
+    return dict(
+        db.session.execute(
+            db.select(ScheduleVersion.scope, ScheduleVersion.version).filter(
+                or_(
+                    ScheduleVersion.scope.between(
+                        start_date.isoformat(), end_date.isoformat()
+                    ),
+                    ScheduleVersion.scope == REFERENCE_SCOPE,
+                )
+            )
+        ).all()
+    )
+
+
+def get_schedule_versions(start_date: date, end_date: date):
+    """
+    Returns the versions of the dates in the range and of REFERENCE_SCOPE,
+    and the sum of the versions of the dates before the range.
+    Versions only increase, so the sum changes whenever an earlier date changes
+    """
+    in_range = sorted(get_scope_versions(start_date, end_date).items())
+    before_sum = db.session.scalar(
+        db.select(func.coalesce(func.sum(ScheduleVersion.version), 0)).filter(
+            ScheduleVersion.scope < start_date.isoformat()
+        )
+    )
+    return in_range, before_sum
+
+
+@event.listens_for(db.session, "after_flush")
+def schedule_version_listener(session, flush_context):
+    """
+    Bumps the schedule versions of the dates and the reference data
+    changed in the flush
+    """
+    scopes = set()
+    date_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, DosuSess):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            scopes.add(obj.dosusess_date)
+            scopes.add(_committed_value(inspect(obj), "dosusess_date"))
+        elif isinstance(obj, TimeSlot):
+            date_ids.add(obj.date_id)
+            date_ids.add(_committed_value(inspect(obj), "date_id"))
+        elif isinstance(obj, (Patient, Worker, DosuType, TimeSlotConfig)):
+            if obj in session.dirty and not session.is_modified(obj):
+                continue
+            scopes.add(REFERENCE_SCOPE)
+
+    date_ids.discard(None)
+    if not scopes and not date_ids:
+        return
+
+    connection = session.connection()
+    if date_ids:
+        scopes.update(
+            connection.execute(
+                db.select(DateTable.date).filter(DateTable.id.in_(date_ids))
+            ).scalars()
+        )
+    scopes.discard(None)
+    bump_schedule_versions(connection, scopes)
+
+
+class DosuSessTombstone(db.Model):
+    # Log of the DosuSess rows that left a date, i.e. were deleted or moved
+    # to another date, written by dosusess_tombstone_listener. Together with
+    # DosuSess.updated_at it lets get_schedule_delta report the removed rows.
+    __tablename__ = "dosusess_tombstone_table"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    dosusess_id: Mapped[int] = mapped_column(Integer)
+    dosusess_date: Mapped[date] = mapped_column(Date)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index(
+            "ix_dosusess_tombstone_table_dosusess_date_deleted_at",
+            "dosusess_date",
+            "deleted_at",
+        ),
+    )
+
+    def __repr__(self):
+        return (
+            f"DosuSessTombstone(dosusess_id={self.dosusess_id!r}, "
+            f"dosusess_date={self.dosusess_date!r})"
+        )
+
+
+# Tokens older than the retention get a full reload, and the tombstones
+# older than it can be pruned. The overlap re-sends the rows changed just
+# before the previous token, whose transactions may not have been committed
+# when it was issued.
+DOSUSESS_TOMBSTONE_RETENTION = timedelta(days=7)
+SCHEDULE_DELTA_OVERLAP = timedelta(seconds=5)
+
+
+def record_dosusess_tombstones(connection, tombstones):
+    """
+    Logs the (dosusess_id, dosusess_date) pairs as removed from the date
+    """
+    tombstones = set(tombstones)
+    if not tombstones:
+        return
+    now = datetime.now()
+    connection.execute(
+        db.insert(DosuSessTombstone),
+        [
+            {"dosusess_id": sess_id, "dosusess_date": sess_date, "deleted_at": now}
+            for sess_id, sess_date in tombstones
+        ],
+    )
+
+
+@event.listens_for(db.session, "after_flush")
+def dosusess_tombstone_listener(session, flush_context):
+    """
+    Records the DosuSess rows deleted in the flush,
+    and the old dates of the ones moved to another date
+    """
+    tombstones = []
+    for obj in session.dirty:
+        if isinstance(obj, DosuSess) and session.is_modified(obj):
+            old_date = _committed_value(inspect(obj), "dosusess_date")
+            if old_date != obj.dosusess_date:
+                tombstones.append((obj.id, old_date))
+    for obj in session.deleted:
+        if isinstance(obj, DosuSess):
+            old_date = _committed_value(inspect(obj), "dosusess_date")
+            tombstones.append((obj.id, old_date))
+    if tombstones:
+        record_dosusess_tombstones(session.connection(), tombstones)
+
+
+def _schedule_event(event_type, obj, old_date=None):
+    payload = {
+        "type": event_type,
+        "id": obj.id,
+        "date": obj.dosusess_date.isoformat() if obj.dosusess_date else None,
+        "room": obj.room,
+        "slot": obj.slot,
+        "status": obj.status,
+    }
+    if old_date is not None and old_date != obj.dosusess_date:
+        payload["old_date"] = old_date.isoformat()
+    return payload
+
+
+@event.listens_for(db.session, "after_flush")
+def schedule_event_listener(session, flush_context):
+    """
+    Collects the dosusess changes of the flush,
+    which are published to the schedule streams once committed
+    """
+    events = []
+    for obj in session.new:
+        if isinstance(obj, DosuSess):
+            events.append(_schedule_event("create", obj))
+    for obj in session.dirty:
+        if isinstance(obj, DosuSess) and session.is_modified(obj):
+            state = inspect(obj)
+            old_status = _committed_value(state, "status")
+            event_type = "status" if old_status != obj.status else "update"
+            old_date = _committed_value(state, "dosusess_date")
+            events.append(_schedule_event(event_type, obj, old_date))
+    for obj in session.deleted:
+        if isinstance(obj, DosuSess):
+            old_date = _committed_value(inspect(obj), "dosusess_date")
+            payload = _schedule_event("delete", obj)
+            payload["date"] = old_date.isoformat() if old_date else None
+            events.append(payload)
+    if events:
+        session.info.setdefault("schedule_events", []).extend(events)
+
+
+def merge_schedule_events(events):
+    """
+    Merges the events of the same dosusess from the flushes of a transaction
+    into one, with the latest values and the date it had before the transaction
+    """
+    merged = {}
+    for payload in events:
+        first = merged.get(payload["id"])
+        if first is None:
+            merged[payload["id"]] = payload
+            continue
+        payload = dict(payload)
+        if first["type"] == "create" and payload["type"] != "delete":
+            payload["type"] = "create"
+        elif first["type"] == "status" and payload["type"] == "update":
+            payload["type"] = "status"
+        old_date = first.get("old_date", first["date"])
+        payload.pop("old_date", None)
+        if first["type"] != "create" and old_date != payload["date"]:
+            payload["old_date"] = old_date
+        merged[payload["id"]] = payload
+    return list(merged.values())
+
+
+@event.listens_for(db.session, "after_commit")
+def publish_schedule_events(session):
+    events = session.info.pop("schedule_events", None)
+    if events:
+        schedule_events.publish(merge_schedule_events(events))
+
+
+@event.listens_for(db.session, "after_rollback")
+def discard_schedule_events(session):
+    session.info.pop("schedule_events", None)
+
+
+def prune_dosusess_tombstones(before: datetime = None):
+    """
+    Deletes the tombstones older than the retention, or than the given time
+    """
+    if before is None:
+        before = datetime.now() - DOSUSESS_TOMBSTONE_RETENTION
+    result = db.session.execute(
+        db.delete(DosuSessTombstone).where(DosuSessTombstone.deleted_at < before)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def make_delta_token(issued_at: datetime, reference_version: int) -> str:
+    return f"{issued_at.isoformat()}|{reference_version}"
+
+
+def parse_delta_token(token: str):
+    """
+    Returns (issued_at, reference_version), or None if the token is malformed
+    """
+    try:
+        issued_at, reference_version = token.split("|")
+        return datetime.fromisoformat(issued_at), int(reference_version)
+    except (AttributeError, ValueError):
+        return None
+
+
+def get_schedule_delta(start_date: date, end_date: date, token: str = None):
+    """
+    Returns the dosusesses of the date range changed since the token was issued:
+    (new token, reset, updated sessions, deleted dosusess ids).
+    Without a usable token, reset is True and updated holds the whole range.
+    The sessions follow the status filter, so the ones that left the filter
+    are reported as deleted
+    """
+    issued_at = datetime.now()
+    reference_version = get_scope_versions(start_date, start_date).get(
+        REFERENCE_SCOPE, 0
+    )
+    new_token = make_delta_token(issued_at, reference_version)
+
+    # patients, workers or dosutypes changed, which are part of every session
+    last = parse_delta_token(token)
+    if (
+        last is None
+        or last[1] != reference_version
+        or last[0] < issued_at - DOSUSESS_TOMBSTONE_RETENTION
+    ):
+        results = get_data_by_date_range(start_date, end_date)
+        return new_token, True, [format_dosusess_detail(row) for row in results], []
+
+    since = last[0] - SCHEDULE_DELTA_OVERLAP
+    changed_ids = set(
+        db.session.scalars(
+            db.select(DosuSess.id).where(
+                DosuSess.dosusess_date.between(start_date, end_date),
+                DosuSess.updated_at > since,
+            )
+        )
+    )
+    changed_ids.update(
+        db.session.scalars(
+            db.select(DosuSessTombstone.dosusess_id).where(
+                DosuSessTombstone.dosusess_date.between(start_date, end_date),
+                DosuSessTombstone.deleted_at > since,
+            )
+        )
+    )
+    if not changed_ids:
+        return new_token, False, [], []
+
+    results = get_data_by_date_range(start_date, end_date, changed_ids)
+    updated = [format_dosusess_detail(row) for row in results]
+    deleted = sorted(changed_ids - {sess["id"] for sess in updated})
+    return new_token, False, updated, deleted
+
+
 class User(db.Model):
     __tablename__ = "user_table"
 
@@ -364,7 +1025,23 @@ class User(db.Model):
         return f"User(id={self.id!r}, username={self.username!r})"
 
 
-def get_timeslot_config(year, month):
+# Effective TimeSlotConfig id per (year, month) with the REFERENCE_SCOPE
+# version it was resolved at. Only the id is cached across requests; the
+# instance itself is reloaded by primary key and then kept in flask.g for the
+# rest of the app context. Every TimeSlotConfig change bumps the reference
+# version, so the changes of the other processes are seen on the next request.
+_timeslot_config_cache = {}
+
+
+def invalidate_timeslot_config_cache():
+    """
+    Drops all the cached (year, month) -> TimeSlotConfig resolutions.
+    Call it whenever a TimeSlotConfig is created, updated or deleted
+    """
+    _timeslot_config_cache.clear()
+
+
+def query_timeslot_config(year, month):
     call_day = date(year, month, 1)
     config_cond = or_(
         and_(
@@ -388,6 +1065,46 @@ def get_timeslot_config(year, month):
     return tsc
 
 
+def get_reference_version() -> int:
+    """
+    Version of REFERENCE_SCOPE, read once per app context
+    """
+    if "reference_version" not in g:
+        g.reference_version = (
+            db.session.scalar(
+                db.select(ScheduleVersion.version).filter(
+                    ScheduleVersion.scope == REFERENCE_SCOPE
+                )
+            )
+            or 0
+        )
+    return g.reference_version
+
+
+def resolve_timeslot_config(year, month):
+    version = get_reference_version()
+    cached = _timeslot_config_cache.get((year, month))
+    if cached and cached[1] == version:
+        tsc = db.session.get(TimeSlotConfig, cached[0])
+        if tsc:
+            return tsc
+
+    tsc = query_timeslot_config(year, month)
+    _timeslot_config_cache[(year, month)] = (tsc.id, version)
+    return tsc
+
+
+def get_timeslot_config(year, month):
+    # the session's identity map holds weak references only,
+    # so keep the resolved configs alive for the app context
+    configs = g.setdefault("timeslot_configs", {})
+    tsc = configs.get((year, month))
+    if tsc is None:
+        tsc = resolve_timeslot_config(year, month)
+        configs[(year, month)] = tsc
+    return tsc
+
+
 def display_date(_date: date):
     weekdays = ["일", "월", "화", "수", "목", "금", "토"]
     weekday = weekdays[_date.weekday()]
@@ -400,16 +1117,7 @@ def display_slot(_date: date, slot: int):
     Converts date and slot number into a slot hour for display
     """
     tsc = get_timeslot_config(_date.year, _date.month)
-    slot_hour = (
-        datetime.combine(datetime.today(), tsc.wd_start_hour)
-        + timedelta(minutes=tsc.duration) * slot
-    )
-    if _date.weekday() != 5 and slot_hour.time() > tsc.wd_lunch_start_hour:
-        dt_end = datetime.combine(datetime.today(), tsc.wd_lunch_end_hour)
-        dt_start = datetime.combine(datetime.today(), tsc.wd_lunch_start_hour)
-        slot_hour -= dt_end - dt_start
-
-    return slot_hour.time().strftime("%H:%M")
+    return tsc.slot_label(slot, is_saturday=_date.weekday() == 5)
 
 
 def format_dosusess_detail(row):
@@ -440,16 +1148,15 @@ def format_dosusess_detail(row):
     return sess
 
 
-def get_data_by_date(
-    target_date: date,
-):  # Subquery to get all TimeSlots for the target date
+def get_data_by_date_range(start_date: date, end_date: date, dosusess_ids=None):
     # if status-filter is active, use TimeSlot which stores only active dosusesses
-    # otherwise, search the DosuSess for the date
+    # otherwise, search the DosuSess for the date range
     if session.get("status_filter", "active") == "active":
+        # Subquery to get all TimeSlots in the date range
         timeslot_subquery = (
             db.select(TimeSlot.dosusess_id)
             .join(DateTable, TimeSlot.date_id == DateTable.id)
-            .where(DateTable.date == target_date)
+            .where(DateTable.date.between(start_date, end_date))
             .distinct()
             .subquery()
         )
@@ -467,14 +1174,20 @@ def get_data_by_date(
             .join(DosuSess.patient)
             .join(DosuSess.worker)
             .where(
-                DosuSess.dosusess_date == target_date,
+                DosuSess.dosusess_date.between(start_date, end_date),
                 DosuSess.status == session.get("status_filter"),
             )
         )
+    if dosusess_ids is not None:
+        stmt = stmt.where(DosuSess.id.in_(dosusess_ids))
 
     return db.session.execute(stmt).all()
 
 
+def get_data_by_date(target_date: date):
+    return get_data_by_date_range(target_date, target_date)
+
+
 def get_data_by_dosusess_id(dosusess_id: int):
     stmt = (
         db.select(DosuSess, DosuType, Worker, Patient)
@@ -492,31 +1205,68 @@ def get_data_by_dosusess_id(dosusess_id: int):
 
 def get_dosusess_detail_by_id(id: int):
     dosusess = get_data_by_dosusess_id(id)
-    return format_dosusess_detail(dosusess)
+    return format_dosusess_detail(dosusess) if dosusess else None
+
+
+def _cache_version(versions: dict, sess_date: date) -> tuple:
+    return (versions.get(sess_date.isoformat(), 0), versions.get(REFERENCE_SCOPE, 0))
 
 
 def get_day_schedule(sess_date: date):
-    results = get_data_by_date(sess_date)
-    dosu_sessions = []
-    if results:
-        for row in results:
-            sess = format_dosusess_detail(row)
-            dosu_sessions.append(sess)
+    status_filter = session.get("status_filter", "active")
+    versions = get_scope_versions(sess_date, sess_date)
+    version = _cache_version(versions, sess_date)
+
+    dosu_sessions = schedule_cache.get(sess_date, status_filter, version)
+    if dosu_sessions is None:
+        results = get_data_by_date(sess_date)
+        dosu_sessions = [format_dosusess_detail(row) for row in results]
+        schedule_cache.set(sess_date, status_filter, version, dosu_sessions)
     return dosu_sessions
 
 
+def get_range_schedule(start_date: date, end_date: date) -> dict:
+    """
+    Fetches the schedule of a date range in a single query
+    and buckets the formatted dosusesses by date
+    """
+    results = get_data_by_date_range(start_date, end_date)
+    r_schedule = {}
+    for row in results:
+        sess = format_dosusess_detail(row)
+        r_schedule.setdefault(row.DosuSess.dosusess_date, []).append(sess)
+    return r_schedule
+
+
 def get_month_schedule(year: int, month: int):
-    # TODO reduce the db access by inputting date range and getting results by filtering of db
-    m_schedule = {}
-    for day in range(1, 32):
-        try:
-            sess_date = datetime(year, month, day).date()
-        except ValueError:
-            continue  # Skip invalid dates
+    first_day, last_day = month_range(year, month)
+    days = [
+        first_day + timedelta(days=offset)
+        for offset in range((last_day - first_day).days + 1)
+    ]
+    status_filter = session.get("status_filter", "active")
+    versions = get_scope_versions(first_day, last_day)
+
+    # the cached days are used only if the whole month is cached,
+    # otherwise the month is loaded with a single query
+    cached = {}
+    for sess_date in days:
+        version = _cache_version(versions, sess_date)
+        dosu_sessions = schedule_cache.get(sess_date, status_filter, version)
+        if dosu_sessions is None:
+            r_schedule = get_range_schedule(first_day, last_day)
+            for day in days:
+                cached[day] = r_schedule.get(day, [])
+                schedule_cache.set(
+                    day, status_filter, _cache_version(versions, day), cached[day]
+                )
+            break
+        cached[sess_date] = dosu_sessions
 
-        dosu_sessions = get_day_schedule(sess_date)
-        if dosu_sessions:
-            m_schedule[str(day)] = dosu_sessions
+    m_schedule = {}
+    for sess_date in days:
+        if cached[sess_date]:
+            m_schedule[str(sess_date.day)] = cached[sess_date]
     return m_schedule
 
 
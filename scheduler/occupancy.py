@@ -0,0 +1,250 @@
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+from scheduler import db
+from scheduler.models import (
+    DateTable,
+    TimeSlot,
+    get_scope_versions,
+    get_timeslot_config,
+)
+
+
+def slot_mask(slot: int, quantity: int) -> int:
+    """
+    Bitmap of the slots slot .. slot + quantity - 1
+    """
+    return ((1 << quantity) - 1) << slot
+
+
+def fit_mask(bitmap: int, quantity: int, slot_count: int) -> int:
+    """
+    Bitmap of the start slots where quantity free slots fit before slot_count
+    """
+    if quantity <= 0 or quantity > slot_count:
+        return 0
+    fits = ~bitmap & ((1 << slot_count) - 1)
+    # after the loop bit n stays set only if the slots n .. n + width - 1
+    # are all free; the width doubles at each step
+    width = 1
+    while width < quantity:
+        step = min(width, quantity - width)
+        fits &= fits >> step
+        width += step
+    return fits & ((1 << (slot_count - quantity + 1)) - 1)
+
+
+def is_free(bitmap: int, slot: int, quantity: int) -> bool:
+    return not bitmap & slot_mask(slot, quantity)
+
+
+def mask_slots(mask: int) -> list:
+    slots = []
+    while mask:
+        lowest = mask & -mask
+        slots.append(lowest.bit_length() - 1)
+        mask ^= lowest
+    return slots
+
+
+def first_fit(bitmap: int, quantity: int, slot_count: int) -> Optional[int]:
+    """
+    Returns the first start slot where quantity free slots fit, or None
+    """
+    fits = fit_mask(bitmap, quantity, slot_count)
+    return (fits & -fits).bit_length() - 1 if fits else None
+
+
+def all_fits(bitmap: int, quantity: int, slot_count: int) -> list:
+    """
+    Returns all the start slots where quantity free slots fit
+    """
+    return mask_slots(fit_mask(bitmap, quantity, slot_count))
+
+
+def day_segments(sess_date: date) -> tuple:
+    """
+    (first slot, end slot) of the working stretches of the date by its
+    TimeSlotConfig: the morning and the afternoon of a weekday around the
+    lunch break, the whole saturday, and none on sundays
+    """
+    weekday = sess_date.weekday()
+    if weekday == 6:
+        return ()
+    tsc = get_timeslot_config(sess_date.year, sess_date.month)
+    table = tsc.slot_table(is_saturday=weekday == 5)
+    if weekday == 5 or not tsc.wd_lunch_start_hour:
+        return ((0, len(table)),)
+    lunch_start = tsc.wd_lunch_start_hour.strftime("%H:%M")
+    morning = sum(1 for label in table if label < lunch_start)
+    segments = ((0, morning), (morning, len(table)))
+    return tuple((start, end) for start, end in segments if end > start)
+
+
+def day_fit_mask(bitmap: int, quantity: int, segments: tuple) -> int:
+    """
+    Bitmap of the start slots where quantity free slots fit within a segment
+    """
+    fits = 0
+    for start, end in segments:
+        fits |= fit_mask(bitmap >> start, quantity, end - start) << start
+    return fits
+
+
+class OccupancyIndex:
+    """
+    Bitmaps of the occupied timeslots per (date, room), where bit n is set
+    when the TimeSlot number n of the room is taken.
+    The days are rebuilt from timeslot_table and stamped with the schedule
+    version of the date, so a day changed by another process is reloaded.
+    Bookings of this process update their day in place
+    """
+
+    def __init__(self, maxdays=1000):
+        self.maxdays = maxdays
+        self._days = OrderedDict()  # date -> (version, {room: bitmap})
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def _load(self, dates: list) -> dict:
+        """
+        Reads the bitmaps of the dates from timeslot_table in a single query
+        """
+        days = {sess_date: {} for sess_date in dates}
+        rows = db.session.execute(
+            db.select(DateTable.date, TimeSlot.room, TimeSlot.number)
+            .join(TimeSlot.date)
+            .filter(DateTable.date.between(min(dates), max(dates)))
+        )
+        for sess_date, room, number in rows:
+            rooms = days.get(sess_date)
+            if rooms is not None:
+                rooms[room] = rooms.get(room, 0) | 1 << number
+        return days
+
+    def get_days(self, start_date: date, end_date: date) -> dict:
+        """
+        Returns {date: {room: bitmap}} of the dates in the range.
+        Costs one version query, plus one timeslot query if any day is stale
+        """
+        versions = get_scope_versions(start_date, end_date)
+        dates = [
+            start_date + timedelta(days=offset)
+            for offset in range((end_date - start_date).days + 1)
+        ]
+
+        days = {}
+        stale = []
+        with self._lock:
+            for sess_date in dates:
+                entry = self._days.get(sess_date)
+                if entry and entry[0] == versions.get(sess_date.isoformat(), 0):
+                    self._days.move_to_end(sess_date)
+                    days[sess_date] = entry[1]
+                else:
+                    stale.append(sess_date)
+            self.hits += len(days)
+
+        if stale:
+            loaded = self._load(stale)
+            with self._lock:
+                self.loads += len(stale)
+                for sess_date, rooms in loaded.items():
+                    version = versions.get(sess_date.isoformat(), 0)
+                    self._days[sess_date] = (version, rooms)
+                    self._days.move_to_end(sess_date)
+                while len(self._days) > self.maxdays:
+                    self._days.popitem(last=False)
+            days.update(loaded)
+        return days
+
+    def get_day(self, sess_date: date) -> dict:
+        return self.get_days(sess_date, sess_date)[sess_date]
+
+    def peek(self, sess_date: date, room: int, version: int) -> Optional[int]:
+        """
+        Returns the bitmap of the room if the day is loaded at the version,
+        without querying, otherwise None
+        """
+        with self._lock:
+            entry = self._days.get(sess_date)
+            if entry and entry[0] == version:
+                return entry[1].get(room, 0)
+        return None
+
+    def occupy(self, sess_date: date, room: int, slots: Iterable[int], version: int):
+        """
+        Marks the slots booked in a transaction which found the date at the
+        version and bumped it once. The day is dropped if it was loaded at
+        another version, as it may miss other changes
+        """
+        with self._lock:
+            entry = self._days.get(sess_date)
+            if not entry or entry[0] != version:
+                self._days.pop(sess_date, None)
+                return
+            rooms = dict(entry[1])
+            for number in slots:
+                rooms[room] = rooms.get(room, 0) | 1 << number
+            self._days[sess_date] = (version + 1, rooms)
+
+    def invalidate(self, dates):
+        with self._lock:
+            for sess_date in set(dates):
+                self._days.pop(sess_date, None)
+
+    def next_available_day(
+        self,
+        room: int,
+        quantity: int,
+        start_date: date,
+        end_date: date,
+    ) -> Optional[tuple]:
+        """
+        Returns (date, slot) of the first fit of quantity slots in the room
+        from start_date to end_date, or None
+        """
+        found = self.search(quantity, [room], start_date, end_date, limit=1)
+        return (found[0][0], found[0][2]) if found else None
+
+    def search(
+        self,
+        quantity: int,
+        rooms: Iterable[int],
+        start_date: date,
+        end_date: date,
+        limit: int,
+        first_slots: dict = None,
+    ) -> list:
+        """
+        Returns up to limit (date, room, slot) starts where quantity slots fit,
+        the earliest first and the rooms in order within the same slot.
+        first_slots maps dates to their earliest allowed slot, e.g. to skip
+        the hours already past today
+        """
+        rooms = sorted(set(rooms))
+        days = self.get_days(start_date, end_date)
+        found = []
+        for sess_date in sorted(days):
+            segments = day_segments(sess_date)
+            bitmaps = days[sess_date]
+            starts = []
+            for room in rooms:
+                fits = day_fit_mask(bitmaps.get(room, 0), quantity, segments)
+                fits &= ~0 << (first_slots or {}).get(sess_date, 0)
+                starts.extend((slot, room) for slot in mask_slots(fits))
+            for slot, room in sorted(starts)[: limit - len(found)]:
+                found.append((sess_date, room, slot))
+            if len(found) >= limit:
+                break
+        return found
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"days": len(self._days), "hits": self.hits, "loads": self.loads}
+
+
+occupancy_index = OccupancyIndex()
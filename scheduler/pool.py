@@ -0,0 +1,92 @@
+import logging
+import threading
+from collections import deque
+from time import perf_counter
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# checkouts waiting longer than this are logged as warnings
+POOL_WAIT_WARNING = 0.1
+
+
+class PoolMetrics:
+    """
+    Checkout counters and wait times of the connection pool of this process.
+    The wait covers the time spent queuing for a free connection and
+    opening a new one when the pool grows
+    """
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=window)
+        self.pool = None
+        self.checkouts = 0
+        self.timeouts = 0
+        self.slow_checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.wait_total += wait
+                self._waits.append(wait)
+                if wait >= POOL_WAIT_WARNING:
+                    self.slow_checkouts += 1
+            self.wait_max = max(self.wait_max, wait)
+        if timed_out:
+            logger.error(f"DB pool checkout timed out after {wait:.3f}s")
+        elif wait >= POOL_WAIT_WARNING:
+            logger.warning(f"DB pool checkout waited {wait:.3f}s")
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            stats = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "slow_checkouts": self.slow_checkouts,
+                "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 2)
+                if self.checkouts
+                else None,
+                "wait_p95_ms": round(waits[int(len(waits) * 0.95)] * 1000, 2)
+                if waits
+                else None,
+                "wait_max_ms": round(self.wait_max * 1000, 2),
+            }
+        if self.pool is not None:
+            stats.update(
+                size=self.pool.size(),
+                checked_out=self.pool.checkedout(),
+                overflow=self.pool.overflow(),
+            )
+        return stats
+
+
+pool_metrics = PoolMetrics()
+
+
+class MeteredQueuePool(QueuePool):
+    """
+    QueuePool recording the checkout waits and timeouts in pool_metrics
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        pool_metrics.pool = self
+
+    def connect(self):
+        start = perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            pool_metrics.record(perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.record(perf_counter() - start)
+        return connection
@@ -3,6 +3,7 @@ import {
   formatDate,
   generateTable,
   fetchSchedule,
+  subscribeSchedule,
   handleAvailableSlotClick,
   getSlotClickHandler,
   isSlotEditable,
@@ -126,7 +127,6 @@ $(document).ready(function () {
   const dateDisplay = $("#dateDisplay");
   const prevDateButton = $("#prevDay");
   const nextDateButton = $("#nextDay");
-  const csrfToken = $('meta[name="csrf_token"]').attr("content");
 
   const userPrivilege = dosusessListContainer.data("user_privilege");
   const statusFilter = dosusessListContainer.data("status_filter");
@@ -136,15 +136,8 @@ $(document).ready(function () {
     dosusessListContainer.data("day"),
   );
 
-  const changeDate = async (increment) => {
-    currentDate.setDate(currentDate.getDate() + increment);
-    if (currentDate.getDay() === 0) {
-      // To skip Sundays
-      currentDate.setDate(currentDate.getDate() + increment);
-    }
-    updateDateDisplay(currentDate, dateDisplay);
-
-    const data = await fetchSchedule(csrfToken, currentDate);
+  const loadSchedule = async () => {
+    const data = await fetchSchedule(currentDate);
     const timeslotConfig = data.timeslotConfig;
     const dSchedule = data.schedule;
     const isEditable = isSlotEditable(userPrivilege, statusFilter, currentDate);
@@ -157,6 +150,24 @@ $(document).ready(function () {
     );
     applyScheduleData(lastSlotIndex, dSchedule);
   };
+
+  // reload the schedule when someone else changes the day
+  let scheduleSource = null;
+
+  const changeDate = async (increment) => {
+    currentDate.setDate(currentDate.getDate() + increment);
+    if (currentDate.getDay() === 0) {
+      // To skip Sundays
+      currentDate.setDate(currentDate.getDate() + increment);
+    }
+    updateDateDisplay(currentDate, dateDisplay);
+
+    if (scheduleSource) {
+      scheduleSource.close();
+    }
+    scheduleSource = subscribeSchedule(currentDate, loadSchedule);
+    await loadSchedule();
+  };
   prevDateButton.on("click", () => changeDate(-1));
   nextDateButton.on("click", () => changeDate(1));
 
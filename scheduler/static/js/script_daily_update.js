@@ -97,7 +97,6 @@ $(document).ready(function () {
   const dateDisplay = $("#dateDisplay");
   const prevDateButton = $("#prevDay");
   const nextDateButton = $("#nextDay");
-  const csrfToken = $('meta[name="csrf_token"]').attr("content");
 
   const userPrivilege = dosusessListContainer.data("user_privilege");
   console.log(userPrivilege);
@@ -118,7 +117,7 @@ $(document).ready(function () {
 
     updateDateDisplay(currentDate, dateDisplay);
 
-    const data = await fetchSchedule(csrfToken, currentDate);
+    const data = await fetchSchedule(currentDate);
     const timeslotConfig = data.timeslotConfig;
     const dSchedule = data.schedule;
     // date before tody is not displayed, so no need to take care of the date condition
@@ -1,16 +1,5 @@
 import { compareDates } from "./script_utils.js";
 
-const convertStrTime = (timeString) => {
-  const time = new Date(`1970-01-01T${timeString}`);
-  return time;
-
-  // const [hours, minutes] = timeString.split(":").map(Number);
-  // const time = new Date();
-  // time.setHours(hours);
-  // time.setMinutes(minutes);
-  // return time;
-};
-
 export const updateDateDisplay = (currentDate, dateDisplay) => {
   const year = currentDate.getFullYear();
   const month = currentDate.getMonth() + 1;
@@ -56,49 +45,28 @@ export function getSlotClickHandler(timeSlot) {
   return handler;
 }
 
+// hs.slots is the precomputed "HH:MM" label table of the day sent by the server
+// (timeslotConfig.wd_slots or sd_slots), where the array index is the slot number
 function* timeSlotGenerator(hs) {
-  let time = hs.startHour;
-  let slotIndex = 0;
-  let divider = false;
-
-  const morningEnd = hs.lunchStartHour || convertStrTime("13:00");
-  const afternoonEnd = hs.overtimeHour || convertStrTime("18:00");
+  const morningEnd = hs.lunchStartHour || "13:00";
+  const afternoonEnd = hs.overtimeHour || "18:00";
 
-  while (time < hs.endHour) {
+  let prevTimeDisplay = null;
+  for (const [slotIndex, timeDisplay] of hs.slots.entries()) {
     // check if a divider is needed
-    const prevTime = new Date(time - hs.duration);
-    if (
-      (prevTime < morningEnd && time >= morningEnd) ||
-      (prevTime < afternoonEnd && time >= afternoonEnd)
-    ) {
-      divider = true;
-    }
-
-    // if it is lunch hours, skip it
-    if (
-      hs.lunchStartHour &&
-      time >= hs.lunchStartHour &&
-      time < hs.lunchEndHour
-    ) {
-      time = hs.lunchEndHour;
-      continue;
-    }
-
-    const formattedTime =
-      time.getHours().toString().padStart(2, "0") +
-      ":" +
-      time.getMinutes().toString().padStart(2, "0");
+    const divider =
+      prevTimeDisplay !== null &&
+      ((prevTimeDisplay < morningEnd && timeDisplay >= morningEnd) ||
+        (prevTimeDisplay < afternoonEnd && timeDisplay >= afternoonEnd));
 
     yield {
       slotIndex,
-      hour: time.getHours(),
-      timeDisplay: formattedTime,
+      hour: parseInt(timeDisplay.slice(0, 2), 10),
+      timeDisplay,
       divider,
     };
 
-    time.setTime(time.getTime() + hs.duration);
-    slotIndex++;
-    divider = false;
+    prevTimeDisplay = timeDisplay;
   }
 }
 
@@ -123,26 +91,15 @@ export const generateTable = (
 
     const isSaturday = currentDate.getDay() === 6;
 
+    // "HH:MM" strings are compared as they are
     let hoursConfig = {};
-    hoursConfig.duration = timeslotConfig.duration * 60 * 1000;
     if (isSaturday) {
-      hoursConfig.startHour = convertStrTime(timeslotConfig.sd_start_hour);
-      hoursConfig.endHour = convertStrTime(timeslotConfig.sd_end_hour);
-      hoursConfig.overtimeHour = convertStrTime(
-        timeslotConfig.sd_overtime_hour,
-      );
+      hoursConfig.slots = timeslotConfig.sd_slots;
+      hoursConfig.overtimeHour = timeslotConfig.sd_overtime_hour;
     } else {
-      hoursConfig.startHour = convertStrTime(timeslotConfig.wd_start_hour);
-      hoursConfig.endHour = convertStrTime(timeslotConfig.wd_end_hour);
-      hoursConfig.lunchStartHour = convertStrTime(
-        timeslotConfig.wd_lunch_start_hour,
-      );
-      hoursConfig.lunchEndHour = convertStrTime(
-        timeslotConfig.wd_lunch_end_hour,
-      );
-      hoursConfig.overtimeHour = convertStrTime(
-        timeslotConfig.wd_overtime_hour,
-      );
+      hoursConfig.slots = timeslotConfig.wd_slots;
+      hoursConfig.lunchStartHour = timeslotConfig.wd_lunch_start_hour;
+      hoursConfig.overtimeHour = timeslotConfig.wd_overtime_hour;
     }
     const slotGen = timeSlotGenerator(hoursConfig);
 
@@ -215,17 +172,30 @@ export const isSlotEditable = (userPrivilege, statusFilter, currentDate) => {
   return isActiveStatus && (isAdmin || isUserAllowed);
 };
 
-export const fetchSchedule = async (csrfToken, currentDate) => {
-  const data = { date: currentDate };
-  data.date = formatDate(data.date);
-  return fetch("/dosusess/get_schedule", {
-    method: "POST",
-    headers: {
-      "Content-Type": "application/json",
-      "X-CSRF-Token": csrfToken,
-    },
-    body: JSON.stringify(data),
-  })
+// GET lets the browser revalidate its copy with the ETag
+// and reuse it when the server answers 304 Not Modified
+export const fetchSchedule = async (currentDate) => {
+  const params = new URLSearchParams({ date: formatDate(currentDate) });
+  return fetch(`/dosusess/get_schedule?${params}`)
     .then((response) => response.json())
     .then((data) => data);
 };
+
+// Calls onChange whenever a dosusess of the date is created, updated or deleted.
+// The server closes the stream now and then and EventSource reconnects by itself,
+// so the schedule is reloaded on reconnection in case something was missed
+export const subscribeSchedule = (currentDate, onChange) => {
+  const params = new URLSearchParams({ start_date: formatDate(currentDate) });
+  const source = new EventSource(`/dosusess/stream?${params}`);
+  ["create", "update", "status", "delete", "reset"].forEach((type) =>
+    source.addEventListener(type, onChange),
+  );
+  let connected = false;
+  source.addEventListener("open", () => {
+    if (connected) {
+      onChange();
+    }
+    connected = true;
+  });
+  return source;
+};
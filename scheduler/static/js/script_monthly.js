@@ -260,16 +260,11 @@ const generateCalendar = (
   }
 };
 
+// GET lets the browser revalidate its copy with the ETag
+// and reuse it when the server answers 304 Not Modified
 const fetchSchedule = async (year, month) => {
-  const csrfToken = $('meta[name="csrf_token"]').attr("content");
-  fetch("/dosusess/get_schedule", {
-    method: "POST",
-    headers: {
-      "Content-Type": "application/json",
-      "X-CSRF-Token": csrfToken,
-    },
-    body: JSON.stringify({ year: year.toString(), month: month.toString() }),
-  })
+  const params = new URLSearchParams({ year: year, month: month });
+  fetch(`/dosusess/get_schedule?${params}`)
     .then((response) => response.json())
     .then((data) => {
       const mSchedule = data.schedule;
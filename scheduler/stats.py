@@ -1,16 +1,15 @@
-import calendar
-from datetime import date
+from collections import namedtuple
 
-from sqlalchemy import and_, func, join
+from sqlalchemy import and_, func, join, tuple_
 
 from scheduler import db
-from scheduler.models import DosuSess, Patient, Worker
+from scheduler.models import DailySummary, DosuSess, DosuType, Patient, Worker
+from scheduler.utils import month_range
 
 
 # automatic count
 def new_patient_count_auto(year, month):
-    first_day = date(year, month, 1)
-    last_day = date(year, month, calendar.monthrange(year, month)[1])
+    first_day, last_day = month_range(year, month)
 
     # Subquery to get the patients of the month
     month_pt = (
@@ -22,8 +21,7 @@ def new_patient_count_auto(year, month):
         .where(
             and_(
                 Patient.mrn != 0,
-                DosuSess.dosusess_date >= first_day,
-                DosuSess.dosusess_date <= last_day,
+                DosuSess.dosusess_date.between(first_day, last_day),
             )
         )
         .distinct()
@@ -58,8 +56,7 @@ def new_patient_count_auto(year, month):
         .join(Worker, DosuSess.worker_id == Worker.id)
         .where(
             and_(
-                DosuSess.dosusess_date >= first_day,
-                DosuSess.dosusess_date <= last_day,
+                DosuSess.dosusess_date.between(first_day, last_day),
                 DosuSess.status == "active",
             )
         )
@@ -85,3 +82,89 @@ def new_patient_count_auto(year, month):
     ]
 
     return res_dict
+
+
+# a row of status_stats; name is the worker or dosutype name, None for the overall
+StatusStat = namedtuple("StatusStat", ["name", "status", "count", "total_amount"])
+
+
+def status_stats(start_date, end_date):
+    """
+    Counts and amounts of the sessions per status, overall, by worker name and
+    by dosutype name, computed in a single pass over the daily summary.
+    The blocked patient is excluded.
+
+    Returns a tuple of (overall, by worker, by dosutype) lists of StatusStat
+    """
+    stmt = (
+        db.select(
+            Worker.name.label("worker_name"),
+            DosuType.name.label("dosutype_name"),
+            DailySummary.status,
+            func.sum(DailySummary.count).label("count"),
+            func.sum(DailySummary.amount).label("total_amount"),
+        )
+        .join(Worker, DailySummary.worker_id == Worker.id)
+        .join(DosuType, DailySummary.dosutype_id == DosuType.id)
+        .where(
+            DailySummary.summary_date.between(start_date, end_date),
+            DailySummary.blocked == False,  # Exclude blocked patient
+        )
+    )
+
+    if db.session.get_bind().dialect.name == "postgresql":
+        return _status_stats_grouping_sets(stmt)
+    return _status_stats_rollup(stmt)
+
+
+def _status_stats_grouping_sets(stmt):
+    # the database computes the three groupings in one scan
+    stmt = stmt.add_columns(
+        func.grouping(Worker.name).label("no_worker"),
+        func.grouping(DosuType.name).label("no_dosutype"),
+    ).group_by(
+        func.grouping_sets(
+            tuple_(DailySummary.status),
+            tuple_(Worker.name, DailySummary.status),
+            tuple_(DosuType.name, DailySummary.status),
+        )
+    )
+
+    stats, worker_stats, dosutype_stats = [], [], []
+    for row in db.session.execute(stmt):
+        if not row.no_worker:
+            stat = StatusStat(row.worker_name, row.status, row.count, row.total_amount)
+            worker_stats.append(stat)
+        elif not row.no_dosutype:
+            stat = StatusStat(
+                row.dosutype_name, row.status, row.count, row.total_amount
+            )
+            dosutype_stats.append(stat)
+        else:
+            stats.append(StatusStat(None, row.status, row.count, row.total_amount))
+    return stats, worker_stats, dosutype_stats
+
+
+def _status_stats_rollup(stmt):
+    # the finest grouping is fetched once and rolled up here
+    stmt = stmt.group_by(Worker.name, DosuType.name, DailySummary.status)
+
+    totals = {"overall": {}, "worker": {}, "dosutype": {}}
+    for row in db.session.execute(stmt):
+        amount = row.total_amount or 0
+        for level, name in (
+            ("overall", None),
+            ("worker", row.worker_name),
+            ("dosutype", row.dosutype_name),
+        ):
+            count_sum = totals[level].setdefault((name, row.status), [0, 0])
+            count_sum[0] += row.count
+            count_sum[1] += amount
+
+    return tuple(
+        [
+            StatusStat(name, status, count, total_amount)
+            for (name, status), (count, total_amount) in totals[level].items()
+        ]
+        for level in ("overall", "worker", "dosutype")
+    )
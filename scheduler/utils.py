@@ -1,4 +1,33 @@
+from calendar import monthrange
+from datetime import date, datetime
 from math import ceil
+from time import monotonic
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import Column, func, tuple_
+from sqlalchemy.sql import functions, visitors
+
+from scheduler import db
+
+
+def month_range(year: int, month: int) -> tuple:
+    """
+    Returns the first and the last day of the month.
+    Raises ValueError for an invalid year or month
+    """
+    first_day = date(year, month, 1)
+    last_day = first_day.replace(day=monthrange(year, month)[1])
+    return first_day, last_day
+
+
+def in_month(column, year: int, month: int):
+    """
+    BETWEEN predicate on a date column for the month, which unlike
+    extract("year"/"month", ...) can use an index on the column
+    """
+    return column.between(*month_range(year, month))
+
 
 class Pagination:
     def __init__(self, query, page, per_page, total, items):
@@ -8,6 +37,9 @@ class Pagination:
         self.total = total
         self.items = items
 
+    def __iter__(self):
+        return iter(self.items)
+
     @property
     def pages(self):
         return ceil(self.total / self.per_page)
@@ -42,4 +74,202 @@ class Pagination:
                 if last + 1 != num:
                     yield None
                 yield num
-                last = num 
\ No newline at end of file
+                last = num 
+
+
+# Row counts of the paginated queries per (statement, parameters) with their
+# expiry time. Moving to the previous or the next page carries the total in
+# the cursor, so only the page number links count the rows again.
+PAGINATION_COUNT_TTL = 30
+_count_cache = {}
+
+
+def cached_count(stmt, refresh: bool = False) -> int:
+    """
+    Number of the rows of the select, cached for PAGINATION_COUNT_TTL seconds.
+    With refresh the rows are counted again, e.g. when the count positions
+    the rows rather than only being shown
+    """
+    compiled = stmt.compile()
+    key = (str(compiled), repr(sorted(compiled.params.items())))
+    cached = _count_cache.get(key)
+    if cached and cached[1] > monotonic() and not refresh:
+        return cached[0]
+
+    total = db.session.scalar(
+        db.select(func.count()).select_from(stmt.order_by(None).subquery())
+    )
+    if len(_count_cache) >= 256:
+        _count_cache.clear()
+    _count_cache[key] = (total, monotonic() + PAGINATION_COUNT_TTL)
+    return total
+
+
+def _dump_key(value):
+    # JSON has no dates
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _load_key(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        return date.fromisoformat(value["d"])
+    return value
+
+
+def _cursor_serializer():
+    return URLSafeSerializer(current_app.secret_key, salt="pagination-cursor")
+
+
+def encode_cursor(key, row_id, before: bool, page: int, total: int) -> str:
+    return _cursor_serializer().dumps([_dump_key(key), row_id, before, page, total])
+
+
+def decode_cursor(cursor: str):
+    """
+    Returns (key, row id, before, page, total) of the cursor,
+    or None if it is missing or was tampered with
+    """
+    if not cursor:
+        return None
+    try:
+        key, row_id, before, page, total = _cursor_serializer().loads(cursor)
+    except (BadSignature, TypeError, ValueError):
+        return None
+    return _load_key(key), row_id, before, page, total
+
+
+class KeysetPagination(Pagination):
+    """
+    Pagination with the cursors of the previous and the next page.
+    The neighbouring pages are known from the rows themselves, as the total
+    may be some seconds old
+    """
+
+    def __init__(self, page, per_page, total, items, prev_cursor, next_cursor):
+        super().__init__(None, page, per_page, total, items)
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def _is_nullable(expression) -> bool:
+    expression = getattr(expression, "expression", expression)
+    if isinstance(expression, functions.coalesce):
+        return False
+    return any(
+        isinstance(element, Column) and element.nullable
+        for element in visitors.iterate(expression)
+    )
+
+
+def keyset_paginate(
+    stmt,
+    sort_key,
+    id_column,
+    descending: bool = True,
+    page: int = 1,
+    per_page: int = 10,
+    cursor: str = None,
+    scalar: bool = True,
+) -> KeysetPagination:
+    """
+    Paginates the select by (sort_key, id_column) seeking past the edge row
+    of the neighbouring page, so the previous and the next page cost the
+    same however deep they are, instead of skipping the rows with OFFSET.
+    The cursor also carries the page number and the total, so following it
+    doesn't count the rows again. Without a cursor the page is read with an
+    OFFSET from the nearer end of the rows.
+    The sort key must not be NULL, coalesce a nullable column. With scalar,
+    the items are the first entity of the rows, otherwise tuples of the
+    selected entities
+    """
+    if _is_nullable(sort_key):
+        raise ValueError(f"The sort key {sort_key} can be NULL")
+
+    state = decode_cursor(cursor)
+    if state:
+        key, last_id, before, page, total = state
+    else:
+        total = cached_count(stmt)
+        pages = max(ceil(total / per_page), 1)
+        page = min(max(page, 1), pages)
+        if page > (pages + 1) // 2:
+            # the last pages are read backwards with an OFFSET from the end,
+            # which would shift with a stale count
+            total = cached_count(stmt, refresh=True)
+    pages = max(ceil(total / per_page), 1)
+
+    stmt = stmt.add_columns(
+        sort_key.label("keyset_key"), id_column.label("keyset_id")
+    ).order_by(None)
+    if descending:
+        forward = (sort_key.desc(), id_column.desc())
+        backward = (sort_key, id_column)
+    else:
+        forward = (sort_key, id_column)
+        backward = (sort_key.desc(), id_column.desc())
+
+    if state:
+        # a row value comparison, which the index on the sort key can range
+        # scan on, unlike the equivalent OR of the key and the id
+        position = tuple_(sort_key, id_column)
+        if before == descending:
+            seek = position > tuple_(key, last_id)
+        else:
+            seek = position < tuple_(key, last_id)
+        stmt = stmt.filter(seek).order_by(*(backward if before else forward))
+        # one more row tells if there is a page beyond
+        rows = db.session.execute(stmt.limit(per_page + 1)).unique().all()
+        more = len(rows) > per_page
+        rows = rows[:per_page]
+        if before:
+            rows.reverse()
+        has_prev, has_next = (more, True) if before else (True, more)
+        # the page number and the total may have drifted with the changes
+        # since the cursor was made, the ends of the rows are known exactly
+        if before:
+            page = max(page, 2) if more else 1
+        elif not more:
+            total = (page - 1) * per_page + len(rows)
+    else:
+        page = min(max(page, 1), pages)
+        if page <= (pages + 1) // 2:
+            stmt = stmt.order_by(*forward).offset((page - 1) * per_page)
+            rows = db.session.execute(stmt.limit(per_page + 1)).unique().all()
+            has_next = len(rows) > per_page
+            rows = rows[:per_page]
+        else:
+            offset = total - page * per_page
+            limit = per_page + min(offset, 0)
+            stmt = stmt.order_by(*backward).offset(max(offset, 0))
+            rows = db.session.execute(stmt.limit(limit)).unique().all()
+            rows.reverse()
+            has_next = offset > 0
+        has_prev = page > 1
+    if has_next:
+        # rows added since the total was counted
+        total = max(total, page * per_page + 1)
+
+    prev_cursor = next_cursor = None
+    if rows and has_prev:
+        prev_cursor = encode_cursor(rows[0][-2], rows[0][-1], True, page - 1, total)
+    if rows and has_next:
+        next_cursor = encode_cursor(rows[-1][-2], rows[-1][-1], False, page + 1, total)
+    if scalar:
+        items = [row[0] for row in rows]
+    else:
+        items = [tuple(row[:-2]) for row in rows]
+    return KeysetPagination(page, per_page, total, items, prev_cursor, next_cursor)
@@ -1,4 +1,6 @@
 import functools
+from collections import namedtuple
+from time import time
 
 from flask import Blueprint, flash, g, render_template, request, session, url_for
 from werkzeug.security import check_password_hash, generate_password_hash
@@ -10,6 +12,54 @@ from scheduler.models import User
 
 bp = Blueprint("auth", __name__, url_prefix="/auth")
 
+# Snapshot of the logged-in user used for authorization. It is kept in the
+# signed session cookie and in a per-process cache, and reloaded from the
+# database once it is older than USER_SNAPSHOT_TTL seconds. user_modify and
+# user_delete invalidate it in this process; the TTL bounds how long other
+# worker processes may go on with the old privileges.
+USER_SNAPSHOT_TTL = 30
+UserSnapshot = namedtuple("UserSnapshot", ["id", "username", "privilege", "available"])
+_user_snapshots = {}  # user id -> (UserSnapshot, loaded_at)
+_user_invalidations = {}  # user id -> time of the last invalidation
+
+
+def invalidate_user_snapshot(user_id):
+    _user_snapshots.pop(user_id, None)
+    _user_invalidations[user_id] = time()
+
+
+def get_user_snapshot(user_id):
+    """
+    Returns the UserSnapshot of the user, or None if the user doesn't exist
+    """
+    now = time()
+    cached = _user_snapshots.get(user_id)
+    if cached and now - cached[1] < USER_SNAPSHOT_TTL:
+        return cached[0]
+
+    stored = session.get("user_snapshot")
+    if (
+        stored
+        and stored.get("id") == user_id
+        and now - stored["loaded_at"] < USER_SNAPSHOT_TTL
+        and stored["loaded_at"] > _user_invalidations.get(user_id, 0)
+    ):
+        snapshot = UserSnapshot(*(stored[field] for field in UserSnapshot._fields))
+        loaded_at = stored["loaded_at"]
+    else:
+        row = db.session.execute(
+            db.select(User.id, User.username, User.privilege, User.available)
+            .filter_by(id=user_id)
+        ).first()
+        if row is None:
+            return None
+        snapshot = UserSnapshot(*row)
+        loaded_at = now
+        session["user_snapshot"] = dict(snapshot._asdict(), loaded_at=loaded_at)
+
+    _user_snapshots[user_id] = (snapshot, loaded_at)
+    return snapshot
+
 
 @bp.route("/list")
 def user_list():
@@ -48,7 +98,7 @@ def signup():
 def update(user_id):
     user = db.get_or_404(User, user_id)
 
-    if g.user != user:
+    if not g.user or g.user.id != user.id:
         flash("수정권한이 없습니다")
         return redirect(url_for("main.monthly"))
 
@@ -106,6 +156,7 @@ def user_modify(id):
                 user.password = generate_password_hash(form.password1.data)
             try:
                 db.session.commit()
+                invalidate_user_snapshot(id)
                 return redirect(url_for("auth.user_list"))
             except Exception as e:
                 db.session.rollback()
@@ -125,6 +176,7 @@ def user_delete(id):
     if request.method == "POST":
         db.session.delete(user)
         db.session.commit()
+        invalidate_user_snapshot(id)
         return redirect(url_for("auth.user_list"))
     else:  # GET
         return render_template(
@@ -143,7 +195,7 @@ def load_logged_in_user():
     if user_id is None:
         g.user = None
     else:
-        g.user = User.query.get(user_id)
+        g.user = get_user_snapshot(user_id)
 
 
 @bp.route("/logout/")
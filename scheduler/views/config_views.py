@@ -4,7 +4,7 @@ from flask import Blueprint, flash, g, redirect, render_template, request, url_f
 
 from scheduler import db
 from scheduler.forms import ConfigForm
-from scheduler.models import TimeSlotConfig
+from scheduler.models import TimeSlotConfig, invalidate_timeslot_config_cache
 
 bp = Blueprint("config", __name__, url_prefix="/config")
 
@@ -59,6 +59,7 @@ def config_create():
             )
             db.session.add(config)
             db.session.commit()
+            invalidate_timeslot_config_cache()
             return redirect(url_for("config.config_detail", id=config.id))
         except Exception as e:
             db.session.rollback()
@@ -97,6 +98,7 @@ def config_update(id):
             config.duration = form.duration.data
             try:
                 db.session.commit()
+                invalidate_timeslot_config_cache()
                 return redirect(url_for("config.config_detail", id=config.id))
             except Exception as e:
                 db.session.rollback()
@@ -125,6 +127,7 @@ def config_delete(id):
     elif request.method == "POST":
         db.session.delete(config)
         db.session.commit()
+        invalidate_timeslot_config_cache()
         return redirect(url_for("config.config_list"))
     else:  # GET
         return render_template(
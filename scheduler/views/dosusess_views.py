@@ -1,4 +1,6 @@
-from datetime import date, datetime
+import hashlib
+from time import monotonic
+from datetime import date, datetime, timedelta
 
 from flask import (
     Blueprint,
@@ -15,20 +17,44 @@ from sqlalchemy import String, cast, or_
 from sqlalchemy.exc import SQLAlchemyError
 
 from scheduler import db
+from scheduler.booking import (
+    BookingBusy,
+    BookingConflict,
+    BookingError,
+    BookingNotFound,
+    BookingSeriesConflict,
+    block_slots,
+    book_dosusess,
+    book_series,
+    get_room_workers,
+    reschedule_dosusess,
+    unblock_slots,
+    weekly_dates,
+    working_dates,
+)
+from scheduler.cache import schedule_cache
+from scheduler.events import format_sse, schedule_events
 from scheduler.models import (
-    DateTable,
     DosuSess,
     DosuType,
     Patient,
-    TimeSlot,
     Worker,
+    display_slot,
     get_day_schedule,
     get_dosusess_detail_by_id,
     get_month_schedule,
-    get_or_create,
+    get_schedule_delta,
+    get_schedule_versions,
     get_timeslot_config,
 )
+from scheduler.occupancy import (
+    day_fit_mask,
+    day_segments,
+    mask_slots,
+    occupancy_index,
+)
 from scheduler.stats import new_patient_count_auto
+from scheduler.utils import month_range
 from scheduler.views.stats_views import new_patient_count
 
 bp = Blueprint("dosusess", __name__, url_prefix="/dosusess")
@@ -124,6 +150,13 @@ def select_patient_to_create_dosusess():
     )
 
 
+def booking_error_message(error):
+    if isinstance(error, BookingConflict):
+        return "이미 예약된 시간과 중복됩니다!!!"
+    current_app.logger.warning(f"Booking failed: {error}")
+    return "다른 예약을 처리하는 중입니다. 잠시 후 다시 시도해 주세요"
+
+
 @bp.route("/create", methods=["GET", "POST"])
 def dosusess_create():
     if request.method == "POST":
@@ -144,41 +177,11 @@ def dosusess_create():
         note = request.form.get("note", "")
         is_first = request.form.get("is_first", "") == "True"
 
-        # Get the dosutype of the id
-        dosutype = db.session.execute(
-            db.select(DosuType).filter_by(id=dosutype_id)
-        ).scalar_one_or_none()
+        # Get the dosutype and the patient of the ids
+        dosutype = db.session.get(DosuType, dosutype_id)
         if not dosutype:
             return "Dosutype not found", 404
-
-        # Check if the time slot is already created
-        # It means that it is already assigned to another dosusess
-        quantity = dosutype.slot_quantity
-        date_obj, is_new_day = get_or_create(DateTable, date=sess_date)
-        if not is_new_day:
-            ts = db.session.execute(
-                db.select(TimeSlot).filter(
-                    TimeSlot.date_id == date_obj.id,
-                    TimeSlot.room == room,
-                    TimeSlot.number >= slot,
-                    TimeSlot.number < slot + quantity,
-                )
-            ).scalar()
-            if ts:
-                flash("이미 예약된 시간과 중복됩니다!!!")
-                return redirect(
-                    url_for(
-                        "dosusess.daily_list",
-                        year=sess_date.year,
-                        month=sess_date.month,
-                        day=sess_date.day,
-                    )
-                )
-
-        # Get the patient of the id
-        patient = db.session.execute(
-            db.select(Patient).filter_by(id=patient_id)
-        ).scalar_one_or_none()
+        patient = db.session.get(Patient, patient_id)
         if not patient:
             return "Patient not found", 404
 
@@ -192,30 +195,21 @@ def dosusess_create():
             return "Worker not found", 404
 
         try:
-            # Create the dosusess
-            dosusess = DosuSess(
-                dosusess_date=sess_date,
-                room=room,
-                slot=slot,
-                dosutype_id=dosutype.id,
-                price=dosutype.price,
+            # Create the dosusess and its timeslots unless they are taken
+            dosusess = book_dosusess(
+                sess_date,
+                room,
+                slot,
+                dosutype,
                 worker_id=worker.id,
                 patient_id=patient.id,
-                status="active",
                 note=note,
                 is_first=is_first,
             )
-            for slot_number in range(slot, slot + quantity):
-                ts = TimeSlot(
-                    date_id=date_obj.id,
-                    room=room,
-                    number=slot_number,
-                    dosusess=dosusess,
-                )
-                dosusess.timeslot_set.append(ts)
-            db.session.add(dosusess)
-            db.session.commit()
+            schedule_cache.invalidate([sess_date])
             current_app.logger.info(f"Created dosusess {dosusess.id}")
+        except BookingError as e:
+            flash(booking_error_message(e))
         except SQLAlchemyError as e:
             db.session.rollback()
             current_app.logger.error(f"Failed to create dosusess: {str(e)}")
@@ -233,6 +227,209 @@ def dosusess_create():
     return redirect(url_for("main.monthly"))
 
 
+# bounds of a booking series
+SERIES_MAX_WEEKS = 52
+SERIES_MAX_OCCURRENCES = 100
+
+
+@bp.route("/create_series", methods=["POST"])
+def dosusess_create_series():
+    """
+    Books a weekly series of dosusesses in one transaction. The JSON body has
+    patient_id, dosutype_id, room, slot, start_date, weekdays (0 is monday),
+    weeks, and optionally interval, note, is_first and skip_conflicts.
+    Taken occurrences are reported one by one and cancel the whole series
+    unless skip_conflicts is true
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        patient_id = int(data["patient_id"])
+        dosutype_id = int(data["dosutype_id"])
+        room = int(data["room"])
+        slot = int(data["slot"])
+        start_date = datetime.strptime(data["start_date"], "%Y-%m-%d").date()
+        weekdays = [int(weekday) for weekday in data["weekdays"]]
+        weeks = int(data["weeks"])
+        interval = int(data.get("interval", 1))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid series: {e}"}), 400
+    if not weekdays or not all(0 <= weekday <= 5 for weekday in weekdays):
+        return jsonify({"error": "weekdays must be between 0 (monday) and 5"}), 400
+    if not 1 <= weeks <= SERIES_MAX_WEEKS or interval < 1 or slot < 0:
+        return jsonify({"error": "Invalid weeks, interval or slot"}), 400
+    dates = weekly_dates(start_date, weekdays, weeks, interval)
+    if not dates or len(dates) > SERIES_MAX_OCCURRENCES:
+        return jsonify({"error": f"{len(dates)} occurrences in the series"}), 400
+
+    dosutype = db.session.get(DosuType, dosutype_id)
+    if not dosutype:
+        return jsonify({"error": "Dosutype not found"}), 404
+    patient = db.session.get(Patient, patient_id)
+    if not patient:
+        return jsonify({"error": "Patient not found"}), 404
+    # Get the first available worker belonging to the room
+    worker = db.session.scalar(
+        db.select(Worker)
+        .filter(Worker.room == room, Worker.available == True)
+        .order_by(Worker.id)
+    )
+    if not worker:
+        return jsonify({"error": "Worker not found"}), 404
+
+    try:
+        created, conflicts = book_series(
+            dates,
+            room,
+            slot,
+            dosutype,
+            worker_id=worker.id,
+            patient_id=patient.id,
+            note=data.get("note", ""),
+            is_first=bool(data.get("is_first", False)),
+            skip_conflicts=bool(data.get("skip_conflicts", False)),
+        )
+    except BookingSeriesConflict as e:
+        return jsonify(e.to_dict()), 409
+    except BookingBusy as e:
+        return jsonify(e.to_dict()), 503
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Failed to create the series: {str(e)}")
+        return jsonify({"error": "Database error occurred"}), 500
+
+    schedule_cache.invalidate(sess_date for _, sess_date in created)
+    current_app.logger.info(
+        f"Created {len(created)} dosusesses of a series, skipped {len(conflicts)}"
+    )
+    return (
+        jsonify(
+            created=[
+                {"id": id, "date": sess_date.isoformat()} for id, sess_date in created
+            ],
+            conflicts=[conflict.to_dict() for conflict in conflicts],
+        ),
+        201,
+    )
+
+
+# bound of a bulk block or unblock
+BLOCK_MAX_DAYS = 92
+
+
+def parse_block_request(data):
+    """
+    Returns (start_date, end_date, rooms) of a block/unblock JSON body
+    """
+    start_date = datetime.strptime(data["start_date"], "%Y-%m-%d").date()
+    end_date = datetime.strptime(data["end_date"], "%Y-%m-%d").date()
+    rooms = sorted({int(room) for room in data["rooms"]})
+    if not rooms or start_date > end_date:
+        raise ValueError("no rooms or an empty date range")
+    if (end_date - start_date).days >= BLOCK_MAX_DAYS:
+        raise ValueError(f"more than {BLOCK_MAX_DAYS} days")
+    return start_date, end_date, rooms
+
+
+@bp.route("/block", methods=["POST"])
+def dosusess_block():
+    """
+    Books a dosutype, e.g. "off", for the blocked patient in the rooms on
+    every day but sunday of a date range, in one transaction. The JSON body
+    has start_date, end_date, rooms, dosutype_id, and optionally slot and
+    skip_conflicts, which behaves as in create_series
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        start_date, end_date, rooms = parse_block_request(data)
+        dosutype_id = int(data["dosutype_id"])
+        slot = int(data.get("slot", 0))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid block: {e}"}), 400
+    dosutype = db.session.get(DosuType, dosutype_id)
+    if not dosutype:
+        return jsonify({"error": "Dosutype not found"}), 404
+    room_workers = get_room_workers(rooms)
+    if len(room_workers) < len(rooms):
+        missing = sorted(set(rooms) - room_workers.keys())
+        return jsonify({"error": f"No available worker in the rooms {missing}"}), 404
+    dates = working_dates(start_date, end_date)
+    if not dates:
+        return jsonify({"error": "No working day in the range"}), 400
+
+    try:
+        created, conflicts = block_slots(
+            dates,
+            room_workers,
+            slot,
+            dosutype,
+            skip_conflicts=bool(data.get("skip_conflicts", False)),
+        )
+    except BookingSeriesConflict as e:
+        return jsonify(e.to_dict()), 409
+    except BookingBusy as e:
+        return jsonify(e.to_dict()), 503
+    except BookingError as e:
+        return jsonify(e.to_dict()), 400
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Failed to block the slots: {str(e)}")
+        return jsonify({"error": "Database error occurred"}), 500
+
+    schedule_cache.invalidate(sess_date for _, sess_date, _ in created)
+    current_app.logger.info(
+        f"Blocked {len(created)} room days, skipped {len(conflicts)}"
+    )
+    return (
+        jsonify(
+            created=[
+                {"id": id, "date": sess_date.isoformat(), "room": room}
+                for id, sess_date, room in created
+            ],
+            conflicts=[conflict.to_dict() for conflict in conflicts],
+        ),
+        201,
+    )
+
+
+@bp.route("/unblock", methods=["POST"])
+def dosusess_unblock():
+    """
+    Deletes the dosusesses of the blocked patient in the rooms and the date
+    range. The JSON body has start_date, end_date, rooms, and optionally
+    dosutype_id to delete only those of the dosutype
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        start_date, end_date, rooms = parse_block_request(data)
+        dosutype_id = data.get("dosutype_id")
+        dosutype_id = int(dosutype_id) if dosutype_id is not None else None
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid unblock: {e}"}), 400
+    dosutype = None
+    if dosutype_id is not None:
+        dosutype = db.session.get(DosuType, dosutype_id)
+        if not dosutype:
+            return jsonify({"error": "Dosutype not found"}), 404
+
+    try:
+        deleted = unblock_slots(start_date, end_date, rooms, dosutype)
+    except BookingBusy as e:
+        return jsonify(e.to_dict()), 503
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(f"Failed to unblock the slots: {str(e)}")
+        return jsonify({"error": "Database error occurred"}), 500
+
+    schedule_cache.invalidate(sess_date for _, sess_date, _ in deleted)
+    current_app.logger.info(f"Unblocked {len(deleted)} room days")
+    return jsonify(
+        deleted=[
+            {"id": id, "date": sess_date.isoformat(), "room": room}
+            for id, sess_date, room in deleted
+        ]
+    )
+
+
 @bp.route("/update", methods=["GET", "POST"])
 def dosusess_update():
     id = int(request.args.get("id", ""))
@@ -240,16 +437,16 @@ def dosusess_update():
 
     if request.method == "POST":
         dosusess = db.get_or_404(DosuSess, id)
+        old_date = dosusess.dosusess_date
         # Get form data
         # theses are the data that are always included in the post req
         status = request.form.get("status", "")
-        dosusess.status = status
-        if status != "active":
-            dosusess.price = 0
-        else:
-            dosusess.price = dosusess.dosutype.price
-        dosusess.note = request.form.get("note", "")
-        dosusess.is_first = request.form.get("is_first", "") == "True"
+        changes = {
+            "status": status,
+            "price": dosusess.dosutype.price if status == "active" else 0,
+            "note": request.form.get("note", ""),
+            "is_first": request.form.get("is_first", "") == "True",
+        }
         _date = request.form.get("dosusess_date", "")
 
         # if the current status_filter is set to 'active' and the status is 'active',
@@ -263,46 +460,9 @@ def dosusess_update():
             except Exception as e:
                 return e, 404
 
-            dosutype = db.session.execute(
-                db.select(DosuType).filter_by(id=dosutype_id)
-            ).scalar_one_or_none()
+            dosutype = db.session.get(DosuType, dosutype_id)
             if not dosutype:
                 return "Dosutype not found", 404
-            quantity = dosutype.slot_quantity
-            # Check if the time slot is already created
-            # It means that it is already assigned to another dosusess
-            date_obj, is_new_day = get_or_create(DateTable, date=sess_date)
-            if not is_new_day:
-                ts = db.session.execute(
-                    db.select(TimeSlot).filter(
-                        TimeSlot.date_id == date_obj.id,
-                        TimeSlot.room == room,
-                        TimeSlot.number >= slot,
-                        TimeSlot.number < slot + quantity,
-                        TimeSlot.dosusess_id != id,  # ok with selecting the self slots
-                    )
-                ).scalar()
-                if ts:
-                    flash("이미 예약된 시간과 중복됩니다!!!")
-                    return redirect(
-                        url_for(
-                            "dosusess.daily_list",
-                            year=sess_date.year,
-                            month=sess_date.month,
-                            day=sess_date.day,
-                        )
-                    )
-            # replace the old timeslots with the new ones
-            dosusess.timeslot_set = []
-            for slot_number in range(slot, slot + quantity):
-                ts, _ = get_or_create(
-                    TimeSlot,
-                    date_id=date_obj.id,
-                    room=room,
-                    number=slot_number,
-                    dosusess=dosusess,
-                )
-                dosusess.timeslot_set.append(ts)
 
             worker = db.session.scalar(
                 db.select(Worker)
@@ -312,21 +472,47 @@ def dosusess_update():
             if not worker:
                 return "Worker not found", 404
 
-            dosusess.dosusess_date = sess_date
-            dosusess.dosutype_id = dosutype.id
-            dosusess.room = room
-            dosusess.slot = slot
-            dosusess.worker_id = worker.id
+            # replace the old timeslots with the new ones,
+            # committed together with the other changes
+            try:
+                reschedule_dosusess(
+                    id, sess_date, room, slot, dosutype, worker_id=worker.id, **changes
+                )
+                schedule_cache.invalidate([old_date, sess_date])
+                return redirect(next_url)
+            except BookingNotFound:
+                return "Dosusess not found", 404
+            except BookingError as e:
+                flash(booking_error_message(e))
+                return redirect(
+                    url_for(
+                        "dosusess.daily_list",
+                        year=sess_date.year,
+                        month=sess_date.month,
+                        day=sess_date.day,
+                    )
+                )
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                flash(f"dosusess: Failed updating {id}: {e}")
+                return render_update_html(id, next_url)
+
+        for key, value in changes.items():
+            setattr(dosusess, key, value)
+
         # if the current status_filter is set to 'noshow' or 'canceled' and
         # the status is 'active', it means that the update is about changing
         # the non-active dosusess to an active one
-        elif session.get("status_filter") != "active" and status == "active":
+        if session.get("status_filter") != "active" and status == "active":
             session["status_filter"] = "active"
+            # flushed, not committed, for the form to find it among the active ones
+            db.session.flush()
             return render_update_html(id, next_url)
 
         try:
             # Commit changes to the database
             db.session.commit()
+            schedule_cache.invalidate([old_date])
             return redirect(next_url)
         except Exception as e:
             db.session.rollback()
@@ -337,6 +523,8 @@ def dosusess_update():
 
 def render_update_html(id, next_url):
     dosusess_detail = get_dosusess_detail_by_id(id)
+    if dosusess_detail is None:
+        return "Dosusess not found", 404
     return render_template(
         "dosusess/update.html",
         dosusess=dosusess_detail,
@@ -352,17 +540,41 @@ def dosusess_delete():
         except Exception as e:
             return e, 404
         dosusess = db.get_or_404(DosuSess, id)
+        sess_date = dosusess.dosusess_date
         db.session.delete(dosusess)
         db.session.commit()
+        schedule_cache.invalidate([sess_date])
 
         next_url = request.form.get("next", "/")
         return redirect(next_url)
 
 
-@bp.route("/get_schedule", methods=["POST"])
+def schedule_etag(year: int, month: int, sess_date: date = None) -> str:
+    """
+    ETag of the schedule payload, derived from the schedule versions.
+    The payload carries the new patient counts of the whole month, which
+    also depend on the earlier dates, so the versions of the month and the
+    sum of the earlier versions are used even for a single day
+    """
+    first_day, last_day = month_range(year, month)
+    versions, before_sum = get_schedule_versions(first_day, last_day)
+    key = repr(
+        (
+            year,
+            month,
+            sess_date,
+            session.get("status_filter", "active"),
+            versions,
+            before_sum,
+        )
+    )
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+@bp.route("/get_schedule", methods=["GET", "POST"])
 def get_schedule_route():
-    if request.method == "POST":
-        try:
+    try:
+        if request.method == "POST":
             # Attempt to parse JSON data
             data = request.get_json(
                 force=True
@@ -370,17 +582,24 @@ def get_schedule_route():
 
             if not data:
                 raise ValueError("No JSON data provided")
+        else:
+            data = request.args
+
+        sess_date = None
+        if data.get("date"):
+            # Parse the javascript date string
+            sess_date = datetime.strptime(data.get("date"), "%Y-%m-%d").date()
+            year = sess_date.year
+            month = sess_date.month
+        else:
+            year = int(data.get("year"))
+            month = int(data.get("month"))
 
-            sess_date = None
-            if data.get("date"):
-                # Parse the javascript date string
-                sess_date = datetime.strptime(data.get("date"), "%Y-%m-%d").date()
-                year = sess_date.year
-                month = sess_date.month
-            else:
-                year = int(data.get("year"))
-                month = int(data.get("month"))
-
+        # Nothing changed since the client's copy
+        etag = schedule_etag(year, month, sess_date)
+        if request.method == "GET" and request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
             # Function to get the schedule for the given year and month
             if sess_date:
                 schedule = get_day_schedule(sess_date)
@@ -392,21 +611,238 @@ def get_schedule_route():
             npc = new_patient_count(year, month, stats_only=True)
             npc_auto = new_patient_count_auto(year, month)
 
-            return jsonify(
+            response = jsonify(
                 schedule=schedule,
                 timeslotConfig=tsc.to_dict(),
                 newPatientCount=npc,
                 newPatientCountAuto=npc_auto,
             )
 
-        except ValueError as e:
-            return jsonify({"error": str(e)}), 400
+        # the payload depends on the status filter in the session cookie,
+        # so it is private and always revalidated
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.vary.add("Cookie")
+        return response
+
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:
+        return (
+            jsonify({"error": "An error occurred while processing the request"}),
+            500,
+        )
 
-        except Exception as e:
-            return (
-                jsonify({"error": "An error occurred while processing the request"}),
-                500,
+
+@bp.route("/get_schedule_delta")
+def get_schedule_delta_route():
+    """
+    The dosusesses of the date range changed since the token of the previous
+    call. Without a token, or when a full reload is needed, reset is true
+    and updated holds the whole range
+    """
+    try:
+        start_date = datetime.strptime(request.args["start_date"], "%Y-%m-%d").date()
+        end_date = datetime.strptime(request.args["end_date"], "%Y-%m-%d").date()
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"Invalid date range: {e}"}), 400
+    if start_date > end_date:
+        return jsonify({"error": "start_date is after end_date"}), 400
+
+    token, reset, updated, deleted = get_schedule_delta(
+        start_date, end_date, request.args.get("token")
+    )
+    response = jsonify(token=token, reset=reset, updated=updated, deleted=deleted)
+    response.cache_control.no_store = True
+    return response
+
+
+# A stream holds a worker thread for its whole life, so it is closed after a
+# while and the browser's EventSource reconnects after SCHEDULE_STREAM_RETRY ms.
+# The comment lines keep the idle connection from being dropped by proxies.
+# Past SCHEDULE_STREAM_MAX streams per process the stream ends right away and
+# the browser retries after SCHEDULE_STREAM_BUSY_RETRY ms, reloading the
+# schedule on each reconnection, so the other requests still get a thread.
+SCHEDULE_STREAM_TIMEOUT = 55
+SCHEDULE_STREAM_HEARTBEAT = 15
+SCHEDULE_STREAM_RETRY = 3000
+SCHEDULE_STREAM_BUSY_RETRY = 30000
+
+
+@bp.route("/stream")
+def schedule_stream():
+    """
+    Server-sent events of the dosusess changes in the date range:
+    create, update, status, delete, and reset when events were dropped
+    or another worker process changed the range
+    """
+    try:
+        start_date = datetime.strptime(request.args["start_date"], "%Y-%m-%d").date()
+        end_date = datetime.strptime(
+            request.args.get("end_date", request.args["start_date"]), "%Y-%m-%d"
+        ).date()
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"Invalid date range: {e}"}), 400
+
+    subscription = schedule_events.subscribe(start_date, end_date)
+
+    def generate():
+        if subscription is None:
+            yield f"retry: {SCHEDULE_STREAM_BUSY_RETRY}\n\n"
+            return
+        with subscription:
+            yield f"retry: {SCHEDULE_STREAM_RETRY}\n\n"
+            deadline = monotonic() + SCHEDULE_STREAM_TIMEOUT
+            while monotonic() < deadline:
+                event = subscription.get(timeout=SCHEDULE_STREAM_HEARTBEAT)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield format_sse(event)
+
+    response = current_app.response_class(generate(), mimetype="text/event-stream")
+    if subscription is not None:
+        # the generator never runs when the client is gone before the response
+        response.call_on_close(subscription.close)
+    response.cache_control.no_cache = True
+    # tell nginx not to buffer the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@bp.route("/schedule_cache_stats")
+def schedule_cache_stats():
+    """
+    Hit/miss counters of the schedule cache of this worker process
+    """
+    return jsonify(schedule_cache.stats())
+
+
+@bp.route("/free_slots")
+def free_slots():
+    """
+    The start slots of each room where the dosutype fits on the date
+    """
+    try:
+        sess_date = datetime.strptime(request.args["date"], "%Y-%m-%d").date()
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"Invalid date: {e}"}), 400
+    dosutype = db.session.get(
+        DosuType, request.args.get("dosutype_id", type=int, default=0)
+    )
+    if dosutype is None:
+        return jsonify({"error": "Unknown dosutype"}), 400
+
+    rooms = db.session.execute(
+        db.select(Worker.room).filter(Worker.available == True).distinct()
+    ).scalars()
+    bitmaps = occupancy_index.get_day(sess_date)
+    segments = day_segments(sess_date)
+    return jsonify(
+        date=sess_date.isoformat(),
+        slots={
+            room: mask_slots(
+                day_fit_mask(bitmaps.get(room, 0), dosutype.slot_quantity, segments)
             )
+            for room in sorted(rooms)
+        },
+    )
+
+
+# bounds of the next_available search
+NEXT_AVAILABLE_HORIZON = 28
+NEXT_AVAILABLE_MAX_HORIZON = 92
+NEXT_AVAILABLE_LIMIT = 5
+NEXT_AVAILABLE_MAX_LIMIT = 20
+
+
+@bp.route("/next_available")
+def next_available():
+    """
+    The earliest (date, room, slot) starts where the dosutype fits from
+    start_date on, within the working hours of each day's TimeSlotConfig.
+    Optionally limited to a room or to the room of a worker, the booker
+    reported is the worker dosusess_create books the room with
+    """
+    dosutype = db.session.get(
+        DosuType, request.args.get("dosutype_id", type=int, default=0)
+    )
+    if dosutype is None:
+        return jsonify({"error": "Unknown dosutype"}), 400
+    today = date.today()
+    try:
+        start_date = datetime.strptime(
+            request.args.get("start_date", today.isoformat()), "%Y-%m-%d"
+        ).date()
+    except ValueError as e:
+        return jsonify({"error": f"Invalid start_date: {e}"}), 400
+    start_date = max(start_date, today)
+    horizon = request.args.get("horizon", type=int, default=NEXT_AVAILABLE_HORIZON)
+    horizon = min(max(horizon, 1), NEXT_AVAILABLE_MAX_HORIZON)
+    limit = request.args.get("limit", type=int, default=NEXT_AVAILABLE_LIMIT)
+    limit = min(max(limit, 1), NEXT_AVAILABLE_MAX_LIMIT)
+    end_date = start_date + timedelta(days=horizon - 1)
+
+    # the first available worker of each room takes the booking,
+    # as in dosusess_create, so a worker_id only picks the room
+    stmt = db.select(Worker).filter(Worker.available == True).order_by(Worker.id)
+    room = request.args.get("room", type=int)
+    worker_id = request.args.get("worker_id", type=int)
+    if worker_id is not None:
+        worker = db.session.get(Worker, worker_id)
+        if worker is None or not worker.available:
+            return jsonify({"error": "No available worker"}), 400
+        if room is not None and room != worker.room:
+            return jsonify({"error": "The worker is not in the room"}), 400
+        room = worker.room
+    if room is not None:
+        stmt = stmt.filter(Worker.room == room)
+    workers = {}
+    for worker in db.session.execute(stmt).scalars():
+        workers.setdefault(worker.room, worker)
+    if not workers:
+        return jsonify({"error": "No available worker"}), 400
+
+    # the slots of today which already started are skipped
+    first_slots = {}
+    if start_date == today:
+        tsc = get_timeslot_config(today.year, today.month)
+        now = datetime.now().strftime("%H:%M")
+        first_slots[today] = sum(
+            1
+            for label in tsc.slot_table(is_saturday=today.weekday() == 5)
+            if label <= now
+        )
+
+    found = occupancy_index.search(
+        dosutype.slot_quantity, workers, start_date, end_date, limit, first_slots
+    )
+    return jsonify(
+        dosutype_id=dosutype.id,
+        start_date=start_date.isoformat(),
+        end_date=end_date.isoformat(),
+        results=[
+            {
+                "date": sess_date.isoformat(),
+                "room": room,
+                "slot": slot,
+                "time": display_slot(sess_date, slot),
+                "worker_id": workers[room].id,
+                "worker_name": workers[room].name,
+            }
+            for sess_date, room, slot in found
+        ],
+    )
+
+
+@bp.route("/occupancy_stats")
+def occupancy_stats():
+    """
+    Counters of the occupancy index of this worker process
+    """
+    return jsonify(occupancy_index.stats())
 
 
 @bp.route("/get_dosusess/<int:id>")
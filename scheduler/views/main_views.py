@@ -1,6 +1,8 @@
 from datetime import datetime
 
-from flask import Blueprint, render_template, session
+from flask import Blueprint, jsonify, render_template, session
+
+from scheduler.pool import pool_metrics
 
 bp = Blueprint("main", __name__)
 
@@ -26,3 +28,11 @@ def monthly(year=None, month=None):
         year=year,
         month=month,
     )
+
+
+@bp.route("/pool_stats")
+def pool_stats():
+    """
+    Checkout counters and waits of the database pool of this worker process
+    """
+    return jsonify(pool_metrics.stats())
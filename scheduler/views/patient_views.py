@@ -19,6 +19,7 @@ from io import StringIO, BytesIO
 from scheduler import db
 from scheduler.forms import PatientForm
 from scheduler.models import DosuSess, DosuType, Patient, Worker
+from scheduler.utils import keyset_paginate
 
 bp = Blueprint("patient", __name__, url_prefix="/patient")
 
@@ -28,13 +29,15 @@ def patient_list():
     kw = request.args.get("kw", type=str, default="")
     so = request.args.get("so", type=str, default="mrn")
     page = request.args.get("page", type=int, default=1)
+    cursor = request.args.get("cursor", type=str, default="")
 
     if so and so == "mrn":
-        patient_list = db.select(Patient).order_by(Patient.mrn.desc())
+        sort_key = Patient.mrn
     elif so and so == "name":
-        patient_list = db.select(Patient).order_by(Patient.name.desc())
+        sort_key = Patient.name
     else:
-        patient_list = db.select(Patient).order_by(Patient.id.desc())
+        sort_key = Patient.id
+    patient_list = db.select(Patient)
 
     if kw:
         search = f"%{kw}%"
@@ -54,10 +57,13 @@ def patient_list():
     except ValueError:
         page = 1
 
-    pagination = db.paginate(
+    pagination = keyset_paginate(
         patient_list,
+        sort_key,
+        Patient.id,
         page=page,
         per_page=10,
+        cursor=cursor,
     )
     return render_template("patient/list.html", pagination=pagination, kw=kw, so=so)
 
@@ -131,12 +137,9 @@ def patient_detail(id):
     patient = db.get_or_404(Patient, id)
     kw = request.args.get("kw", type=str, default="")
     page = request.args.get("page", type=int, default=1)
+    cursor = request.args.get("cursor", type=str, default="")
 
-    dosusess_list = (
-        db.select(DosuSess)
-        .filter_by(patient_id=id)
-        .order_by(DosuSess.dosusess_date.desc())
-    )
+    dosusess_list = db.select(DosuSess).filter_by(patient_id=id)
 
     if kw:
         search = f"%{kw}%"
@@ -153,10 +156,13 @@ def patient_detail(id):
             .distinct()
         )
 
-    pagination = db.paginate(
+    pagination = keyset_paginate(
         dosusess_list,
+        DosuSess.dosusess_date,
+        DosuSess.id,
         page=page,
         per_page=10,
+        cursor=cursor,
     )
 
     today = date.today()
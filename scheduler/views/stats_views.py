@@ -1,4 +1,3 @@
-from calendar import monthrange
 from datetime import date, datetime
 
 from flask import (
@@ -11,12 +10,13 @@ from flask import (
     request,
     url_for,
 )
-from sqlalchemy import Integer, String, extract, func, or_
+from sqlalchemy import Integer, String, func, or_
 
 from scheduler import db
 from scheduler.forms import PatientStatsForm, WorkerStatsForm
-from scheduler.models import DosuSess, DosuType, Patient, Worker
-from scheduler.utils import Pagination
+from scheduler.models import DailySummary, DosuSess, DosuType, Patient, Worker
+from scheduler.stats import status_stats
+from scheduler.utils import in_month, keyset_paginate, month_range
 
 bp = Blueprint("stats", __name__, url_prefix="/stats")
 
@@ -98,10 +98,7 @@ def patient_stats():
 
         # per worker stats
         worker_counts = patient.get_worker_counts(start_date, end_date)
-        for worker_id, status_dict in worker_counts.items():
-            worker_name = db.session.scalar(
-                db.select(Worker.name).where(Worker.id == worker_id)
-            )
+        for (worker_id, worker_name), status_dict in worker_counts.items():
             for status, count in status_dict.items():
                 more_stats["치료사별"][f"{worker_name} - {status}"] = count
 
@@ -169,7 +166,23 @@ def worker_stats():
             )
         )
 
-        status_stats = query.group_by(DosuSess.status).all()
+        # overall and per dosutype counts come from the daily summary
+        summary_query = (
+            db.session.query(
+                DailySummary.status,
+                DosuType.name.label("dosutype_name"),
+                func.sum(DailySummary.count).label("count"),
+                func.sum(DailySummary.amount).label("total_amount"),
+            )
+            .join(DosuType, DailySummary.dosutype_id == DosuType.id)
+            .filter(
+                DailySummary.worker_id == worker_id if worker_id != 0 else True,
+                DailySummary.blocked == False,
+                DailySummary.summary_date.between(start_date, end_date),
+            )
+        )
+
+        status_stats = summary_query.group_by(DailySummary.status).all()
 
         overview_stats = {
             "total": 0,
@@ -197,7 +210,9 @@ def worker_stats():
         }
 
         # per dosutype, counts status
-        dosutype_stats = query.group_by(DosuType.name, DosuSess.status).all()
+        dosutype_stats = summary_query.group_by(
+            DosuType.name, DailySummary.status
+        ).all()
         status_counts = {}
         # Accumulate counts for each dosutype and status
         for dosutype_stat in dosutype_stats:
@@ -220,6 +235,17 @@ def worker_stats():
 
         # per patient, counts status
         patient_stats = query.group_by(Patient.id, DosuSess.status).all()
+
+        # lifetime counts of the patients above in a single grouped query
+        pt_ids = query.with_entities(DosuSess.patient_id).distinct().subquery()
+        pt_totals = {}
+        for pt_id, status, count in db.session.execute(
+            db.select(DosuSess.patient_id, DosuSess.status, func.count(DosuSess.id))
+            .where(DosuSess.patient_id.in_(db.select(pt_ids.c.patient_id)))
+            .group_by(DosuSess.patient_id, DosuSess.status)
+        ):
+            pt_totals.setdefault(pt_id, {})[status] = count
+
         status_counts = {}
         # Accumulate counts for each patient and status
         for pt_stat in patient_stats:
@@ -231,10 +257,7 @@ def worker_stats():
             # Ensure the pt_id_name is in the dictionary
             # if it is a new patient, create a dict container which includes total counts
             if pt_mrn_name not in status_counts:
-                patient = db.session.scalar(
-                    db.select(Patient).where(Patient.id == pt_id)
-                )
-                pt_total = patient.get_status_counts()
+                pt_total = pt_totals.get(pt_id, {})
                 pt_total = f"{pt_total.get('active', 0)} - {pt_total.get('canceled', 0)} - {pt_total.get('noshow', 0)}"
 
                 # create an entry
@@ -282,15 +305,15 @@ def dosusess_stats():
 
         stats = (
             db.session.query(
-                func.count(DosuSess.id).label("total_dosusess"),
-                func.sum(DosuSess.price).label("total_amount"),
+                func.sum(DailySummary.count).label("total_dosusess"),
+                func.sum(DailySummary.amount).label("total_amount"),
             )
-            .filter(DosuSess.dosusess_date.between(start_date, end_date))
+            .filter(DailySummary.summary_date.between(start_date, end_date))
             .first()
         )
 
         result = {
-            "total_dosusess": stats.total_dosusess,
+            "total_dosusess": stats.total_dosusess or 0,
             "total_amount": float(stats.total_amount or 0),
         }
 
@@ -307,10 +330,18 @@ def new_patient_count(year=None, month=None, stats_only=False):
     kw = request.args.get("kw", type=str, default="")
     page = request.args.get("page", type=int, default=1)
 
+    # Validate year and month
+    try:
+        month_condition = in_month(DosuSess.dosusess_date, year, month)
+    except ValueError:
+        if stats_only:
+            raise
+        flash("Invalid year or month selected")
+        return redirect(url_for("main.monthly"))
+
     # Create base query with common conditions
     base_condition = [
-        extract("year", DosuSess.dosusess_date) == year,
-        extract("month", DosuSess.dosusess_date) == month,
+        month_condition,
         DosuSess.status == "active",
         DosuSess.is_first == True,
     ]
@@ -403,58 +434,10 @@ def monthly_stats():
         return redirect(url_for("stats.monthly_stats"))
 
     # Get the start and end dates for the specified month
-    _, last_day = monthrange(year, month)
-    start_date = date(year, month, 1)
-    end_date = date(year, month, last_day)
-
-    # Query for overall statistics - exclude blocked patient
-    stats = db.session.execute(
-        db.select(
-            DosuSess.status,
-            func.count(DosuSess.id).label("count"),
-            func.sum(DosuSess.price).label("total_amount"),
-        )
-        .join(Patient, DosuSess.patient_id == Patient.id)  # Add join with Patient
-        .where(
-            DosuSess.dosusess_date.between(start_date, end_date),
-            Patient.mrn != 0,  # Exclude blocked patient
-        )
-        .group_by(DosuSess.status)
-    ).all()
+    start_date, end_date = month_range(year, month)
 
-    # Query for statistics by worker - exclude blocked patient
-    worker_stats = db.session.execute(
-        db.select(
-            Worker.name,
-            DosuSess.status,
-            func.count(DosuSess.id).label("count"),
-            func.sum(DosuSess.price).label("total_amount"),
-        )
-        .join(DosuSess.worker)
-        .join(Patient, DosuSess.patient_id == Patient.id)  # Add join with Patient
-        .where(
-            DosuSess.dosusess_date.between(start_date, end_date),
-            Patient.mrn != 0,  # Exclude blocked patient
-        )
-        .group_by(Worker.name, DosuSess.status)
-    ).all()
-
-    # Query for statistics by dosutype - exclude blocked patient
-    dosutype_stats = db.session.execute(
-        db.select(
-            DosuType.name,
-            DosuSess.status,
-            func.count(DosuSess.id).label("count"),
-            func.sum(DosuSess.price).label("total_amount"),
-        )
-        .join(DosuSess.dosutype)
-        .join(Patient, DosuSess.patient_id == Patient.id)  # Add join with Patient
-        .where(
-            DosuSess.dosusess_date.between(start_date, end_date),
-            Patient.mrn != 0,  # Exclude blocked patient
-        )
-        .group_by(DosuType.name, DosuSess.status)
-    ).all()
+    # Statistics overall, by worker and by dosutype - exclude blocked patient
+    stats, worker_stats, dosutype_stats = status_stats(start_date, end_date)
 
     # Process the statistics
     overview_stats = {
@@ -528,6 +511,14 @@ def dosusess_list():
     sort_by = request.args.get("sort", type=str, default="date")  # default sort by date
     order = request.args.get("order", type=str, default="desc")
     page = request.args.get("page", type=int, default=1)
+    cursor = request.args.get("cursor", type=str, default="")
+
+    # Validate year and month
+    try:
+        month_condition = in_month(DosuSess.dosusess_date, year, month)
+    except ValueError:
+        flash("Invalid year or month selected")
+        return redirect(url_for("stats.dosusess_list"))
 
     # Create base query - exclude blocked patient
     base_query = (
@@ -536,8 +527,7 @@ def dosusess_list():
         .join(Worker, DosuSess.worker_id == Worker.id)
         .join(DosuType, DosuSess.dosutype_id == DosuType.id)
         .where(
-            extract("year", DosuSess.dosusess_date) == year,
-            extract("month", DosuSess.dosusess_date) == month,
+            month_condition,
             Patient.mrn != 0,  # Exclude blocked patient
         )
     )
@@ -568,23 +558,19 @@ def dosusess_list():
     }
 
     sort_column = sort_options.get(sort_by, DosuSess.dosusess_date)
-    if order == "desc":
-        sort_column = sort_column.desc()
-    base_query = base_query.order_by(sort_column)
-
-    # Execute query with manual pagination
-    per_page = 20
-    offset = (page - 1) * per_page
-
-    # Get total count for pagination
-    count_query = db.select(func.count()).select_from(base_query.subquery())
-    total = db.session.scalar(count_query)
 
-    # Get paginated results
-    results = db.session.execute(base_query.offset(offset).limit(per_page)).all()
-
-    # Create pagination object manually
-    pagination = Pagination(None, page, per_page, total, results)
+    # Seek by (sort column, id) instead of OFFSET, with the total
+    # carried over from page to page
+    pagination = keyset_paginate(
+        base_query,
+        sort_column,
+        DosuSess.id,
+        descending=order == "desc",
+        page=page,
+        per_page=20,
+        cursor=cursor,
+        scalar=False,
+    )
 
     return render_template(
         "stats/dosusess_list.html",
@@ -5,6 +5,7 @@ from flask import Blueprint, flash, g, redirect, render_template, request, url_f
 from scheduler import db
 from scheduler.forms import WorkerForm
 from scheduler.models import DosuSess, DosuType, Patient, User, Worker
+from scheduler.utils import keyset_paginate
 
 bp = Blueprint("worker", __name__, url_prefix="/worker")
 
@@ -79,6 +80,7 @@ def worker_detail(id):
     worker = db.get_or_404(Worker, id)
     kw = request.args.get("kw", type=str, default="")
     page = request.args.get("page", type=int, default=1)
+    cursor = request.args.get("cursor", type=str, default="")
 
     start_date = datetime.strptime(
         request.args.get(
@@ -99,13 +101,9 @@ def worker_detail(id):
         "%Y-%m-%d",
     )
 
-    dosusess_list = (
-        db.select(DosuSess)
-        .filter(
-            DosuSess.worker_id == id,
-            DosuSess.dosusess_date.between(start_date, end_date),
-        )
-        .order_by(DosuSess.dosusess_date.desc())
+    dosusess_list = db.select(DosuSess).filter(
+        DosuSess.worker_id == id,
+        DosuSess.dosusess_date.between(start_date, end_date),
     )
 
     if kw:
@@ -124,10 +122,13 @@ def worker_detail(id):
             .distinct()
         )
 
-    pagination = db.paginate(
+    pagination = keyset_paginate(
         dosusess_list,
+        DosuSess.dosusess_date,
+        DosuSess.id,
         page=page,
         per_page=10,
+        cursor=cursor,
     )
 
     return render_template(
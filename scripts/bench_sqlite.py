@@ -0,0 +1,178 @@
+"""
+Compares the reader/writer throughput of an SQLite database without and with
+the SQLITE_PRAGMAS of appconfig.default.
+
+Runs on a temporary copy of the database, so the journal mode can be switched
+freely and the live database is left alone:
+
+    python scripts/bench_sqlite.py scheduler.db --seconds 5 --readers 4
+
+Readers run the month schedule query on the latest month with sessions,
+writers insert and delete rows of a scratch table, one transaction each.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from collections import Counter
+from time import perf_counter
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from appconfig.default import SQLITE_PRAGMAS  # noqa: E402
+from scheduler import apply_sqlite_pragmas  # noqa: E402
+
+# the month schedule query, the most frequent read
+BENCH_READ_SQL = """
+SELECT s.*, t.name, t.slot_quantity, w.name, p.mrn, p.name, p.tel, p.note
+FROM dosu_session_table AS s
+JOIN dosutype_table AS t ON t.id = s.dosutype_id
+JOIN worker_table AS w ON w.id = s.worker_id
+JOIN patient_table AS p ON p.id = s.patient_id
+WHERE s.dosusess_date BETWEEN ? AND ?
+"""
+# roughly the rows a 30-slot booking writes
+BENCH_WRITE_ROWS = 30
+
+PROFILES = {
+    "default": {"journal_mode": "DELETE", "synchronous": "FULL"},
+    "SQLITE_PRAGMAS": SQLITE_PRAGMAS,
+}
+
+
+def copy_database(source: str, target: str):
+    """
+    Copies the database with the backup API, which takes a consistent
+    snapshot including the commits still in a -wal file
+    """
+    source_connection = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    target_connection = sqlite3.connect(target)
+    with target_connection:
+        source_connection.backup(target_connection)
+    source_connection.close()
+    target_connection.close()
+
+
+def set_journal_mode(path: str, journal_mode: str):
+    connection = sqlite3.connect(path, isolation_level=None)
+    mode = connection.execute(f"PRAGMA journal_mode={journal_mode}").fetchone()[0]
+    connection.close()
+    if mode.lower() != journal_mode.lower():
+        raise click.ClickException(
+            f"The journal mode stayed {mode} instead of {journal_mode}"
+        )
+
+
+def bench(path, pragmas, seconds, readers, writers, month_range) -> Counter:
+    """
+    Runs reader and writer threads on their own connections for the given
+    seconds and returns their counts and latencies
+    """
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = Counter()
+    read_latencies = []
+
+    def connect():
+        connection = sqlite3.connect(
+            path, timeout=5, isolation_level=None, check_same_thread=False
+        )
+        apply_sqlite_pragmas(connection, pragmas)
+        return connection
+
+    def reader():
+        connection = connect()
+        while not stop.is_set():
+            start = perf_counter()
+            try:
+                connection.execute(BENCH_READ_SQL, month_range).fetchall()
+            except sqlite3.OperationalError:
+                with lock:
+                    stats["read errors"] += 1
+                continue
+            with lock:
+                stats["reads"] += 1
+                read_latencies.append(perf_counter() - start)
+        connection.close()
+
+    def writer():
+        connection = connect()
+        rows = [("x" * 100,)] * BENCH_WRITE_ROWS
+        while not stop.is_set():
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.executemany(
+                    "INSERT INTO bench_write_table (payload) VALUES (?)", rows
+                )
+                connection.execute("COMMIT")
+                connection.execute("BEGIN IMMEDIATE")
+                connection.execute("DELETE FROM bench_write_table")
+                connection.execute("COMMIT")
+            except sqlite3.OperationalError:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                with lock:
+                    stats["write errors"] += 1
+                continue
+            with lock:
+                stats["writes"] += 2
+        connection.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    stop.wait(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    read_latencies.sort()
+    if read_latencies:
+        stats["read p95 ms"] = read_latencies[int(len(read_latencies) * 0.95)] * 1000
+        stats["read max ms"] = read_latencies[-1] * 1000
+    return stats
+
+
+@click.command()
+@click.argument("database", type=click.Path(exists=True, dir_okay=False))
+@click.option("--seconds", type=float, default=5, show_default=True)
+@click.option("--readers", type=int, default=4, show_default=True)
+@click.option("--writers", type=int, default=1, show_default=True)
+def main(database, seconds, readers, writers):
+    """Benchmark a copy of DATABASE without and with SQLITE_PRAGMAS."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        copy_database(database, path)
+
+        connection = sqlite3.connect(path, isolation_level=None)
+        latest = connection.execute(
+            "SELECT max(dosusess_date) FROM dosu_session_table"
+        ).fetchone()[0]
+        connection.execute(
+            "CREATE TABLE bench_write_table (id INTEGER PRIMARY KEY, payload TEXT)"
+        )
+        connection.close()
+        if latest is None:
+            raise click.ClickException("There are no dosusesses to read")
+        month_range = (latest[:8] + "01", latest)
+
+        for name, pragmas in PROFILES.items():
+            # no other connection is open, so the journal mode can change
+            set_journal_mode(path, pragmas.get("journal_mode", "DELETE"))
+            stats = bench(path, pragmas, seconds, readers, writers, month_range)
+            click.echo(
+                f"{name:>14}: "
+                f"{stats['reads'] / seconds:8.1f} reads/s  "
+                f"{stats['writes'] / seconds:7.1f} writes/s  "
+                f"read p95 {stats['read p95 ms']:6.1f} ms  "
+                f"max {stats['read max ms']:7.1f} ms  "
+                f"errors {stats['read errors'] + stats['write errors']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
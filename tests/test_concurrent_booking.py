@@ -0,0 +1,68 @@
+import threading
+from collections import Counter
+from datetime import date
+
+from scheduler import db
+from scheduler.booking import BookingBusy, BookingConflict, book_dosusess
+from scheduler.models import DosuSess, DosuType, TimeSlot
+
+SESS_DATE = date(2030, 1, 7)
+THREADS = 8
+ROUNDS = 5
+
+
+def book_at_once(app, schedule, threads=THREADS):
+    """
+    Books the same slot from the threads released together by a barrier.
+    Returns the ids of the booked dosusesses and the outcomes
+    """
+    barrier = threading.Barrier(threads)
+    booked = []
+    outcomes = Counter()
+
+    def attempt():
+        with app.app_context():
+            barrier.wait()
+            try:
+                dosusess = book_dosusess(
+                    SESS_DATE,
+                    1,
+                    0,
+                    db.session.get(DosuType, schedule.dosutype_id),
+                    worker_id=schedule.worker_ids[0],
+                    patient_id=schedule.patient_id,
+                )
+                booked.append(dosusess.id)
+                outcomes["booked"] += 1
+            except BookingConflict:
+                outcomes["conflict"] += 1
+            except BookingBusy:
+                outcomes["busy"] += 1
+            except Exception as e:
+                outcomes[repr(e)] += 1
+            finally:
+                db.session.remove()
+
+    workers = [threading.Thread(target=attempt) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return booked, outcomes
+
+
+def test_one_of_the_concurrent_bookings_wins(app, schedule):
+    # the threads have their own sessions, don't keep a transaction open
+    db.session.close()
+    for _ in range(ROUNDS):
+        booked, outcomes = book_at_once(app, schedule)
+
+        assert len(booked) == 1, outcomes
+        assert set(outcomes) <= {"booked", "conflict", "busy"}, outcomes
+        assert db.session.scalar(
+            db.select(db.func.count(TimeSlot.id)).filter_by(dosusess_id=booked[0])
+        ) == db.session.get(DosuType, schedule.dosutype_id).slot_quantity
+
+        db.session.delete(db.session.get(DosuSess, booked[0]))
+        db.session.commit()
+        db.session.close()
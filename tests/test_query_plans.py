@@ -0,0 +1,98 @@
+from datetime import date
+
+import pytest
+from flask import session
+from sqlalchemy import event, func
+
+from scheduler import db
+from scheduler.models import DosuSess, get_data_by_date_range
+from scheduler.utils import in_month
+
+DATE_STATUS_INDEX = "ix_dosu_session_table_dosusess_date_status"
+
+
+def captured_statement(app, run, status_filter="active"):
+    """
+    Returns the (sql, params) of the last statement run executes
+    """
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        with app.test_request_context():
+            session["status_filter"] = status_filter
+            run()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+    return statements[-1]
+
+
+def month_count():
+    return db.session.scalar(
+        db.select(func.count(DosuSess.id)).filter(
+            in_month(DosuSess.dosusess_date, 2026, 10),
+            DosuSess.status == "active",
+        )
+    )
+
+
+def date_range():
+    return get_data_by_date_range(date(2026, 10, 1), date(2026, 10, 31))
+
+
+def sqlite_plan(statement, parameters) -> str:
+    rows = db.session.connection().exec_driver_sql(
+        "EXPLAIN QUERY PLAN " + statement, parameters
+    )
+    return "\n".join(row[-1] for row in rows)
+
+
+def postgres_plan(statement, parameters) -> str:
+    connection = db.session.connection()
+    # the test tables are empty, so a sequential scan would always win
+    connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    rows = connection.exec_driver_sql("EXPLAIN " + statement, parameters)
+    return "\n".join(row[0] for row in rows)
+
+
+def test_month_filter_uses_date_status_index(app):
+    plan = sqlite_plan(*captured_statement(app, month_count))
+    assert f"USING COVERING INDEX {DATE_STATUS_INDEX}" in plan
+    assert "SCAN dosu_session_table" not in plan
+
+
+def test_date_range_by_status_uses_date_status_index(app):
+    plan = sqlite_plan(*captured_statement(app, date_range, "canceled"))
+    assert f"USING INDEX {DATE_STATUS_INDEX}" in plan
+    assert "SCAN dosu_session_table" not in plan
+
+
+def test_active_date_range_uses_timeslot_index(app):
+    plan = sqlite_plan(*captured_statement(app, date_range))
+    # the unique constraints on date_table.date and on timeslot_table
+    # (date_id, room, number)
+    assert "date_table USING COVERING INDEX sqlite_autoindex_date_table_1" in plan
+    assert "timeslot_table USING INDEX sqlite_autoindex_timeslot_table_1" in plan
+    assert "SCAN timeslot_table" not in plan
+
+
+@pytest.mark.postgres
+def test_month_filter_uses_date_status_index_postgres(pg_app):
+    plan = postgres_plan(*captured_statement(pg_app, month_count))
+    assert DATE_STATUS_INDEX in plan
+
+
+@pytest.mark.postgres
+def test_date_range_by_status_uses_date_status_index_postgres(pg_app):
+    plan = postgres_plan(*captured_statement(pg_app, date_range, "canceled"))
+    assert DATE_STATUS_INDEX in plan
+
+
+@pytest.mark.postgres
+def test_active_date_range_uses_timeslot_index_postgres(pg_app):
+    plan = postgres_plan(*captured_statement(pg_app, date_range))
+    assert "uq_date_table_date" in plan
+    assert "unique_timeslot_constraint" in plan
@@ -0,0 +1,148 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from scheduler import booking, db
+from scheduler.booking import BookingNotFound, book_dosusess, reschedule_dosusess
+from scheduler.models import DateTable, DosuSess, DosuType, TimeSlot
+from scheduler.views import dosusess_views
+
+SESS_DATE = date(2030, 1, 7)
+NEW_DATE = date(2030, 1, 8)
+
+
+def book(schedule, slot=0):
+    return book_dosusess(
+        SESS_DATE,
+        1,
+        slot,
+        db.session.get(DosuType, schedule.dosutype_id),
+        worker_id=schedule.worker_ids[0],
+        patient_id=schedule.patient_id,
+    )
+
+
+def delete_elsewhere(dosusess_id):
+    """
+    Deletes the dosusess on another connection, like another worker would
+    """
+    with db.engine.connect() as connection:
+        connection.execute(
+            db.delete(TimeSlot).where(TimeSlot.dosusess_id == dosusess_id)
+        )
+        connection.execute(db.delete(DosuSess).where(DosuSess.id == dosusess_id))
+        connection.commit()
+
+
+def timeslot_count(dosusess_id):
+    return db.session.scalar(
+        db.select(db.func.count(TimeSlot.id)).filter_by(dosusess_id=dosusess_id)
+    )
+
+
+def test_reschedule_of_a_dosusess_deleted_after_loading(schedule):
+    dosusess = book(schedule)
+    dosusess_id = dosusess.id
+    # the copy in the identity map outlives the row
+    assert db.session.get(DosuSess, dosusess_id) is dosusess
+    delete_elsewhere(dosusess_id)
+
+    with pytest.raises(BookingNotFound):
+        reschedule_dosusess(
+            dosusess_id,
+            NEW_DATE,
+            2,
+            0,
+            db.session.get(DosuType, schedule.dosutype_id),
+            worker_id=schedule.worker_ids[1],
+        )
+    assert timeslot_count(dosusess_id) == 0
+
+
+def test_reschedule_of_a_dosusess_deleted_before_the_update(schedule):
+    dosusess = book(schedule)
+    dosusess_id = dosusess.id
+
+    # a writer which doesn't lock the dates deletes the row between the
+    # read and the update of the reschedule
+    @event.listens_for(db.session, "before_flush", once=True)
+    def delete_row(session, flush_context, instances):
+        connection = session.connection()
+        connection.execute(
+            db.delete(TimeSlot).where(TimeSlot.dosusess_id == dosusess_id)
+        )
+        connection.execute(db.delete(DosuSess).where(DosuSess.id == dosusess_id))
+
+    try:
+        with pytest.raises(BookingNotFound):
+            reschedule_dosusess(
+                dosusess_id,
+                NEW_DATE,
+                2,
+                0,
+                db.session.get(DosuType, schedule.dosutype_id),
+                worker_id=schedule.worker_ids[1],
+            )
+    finally:
+        if event.contains(db.session, "before_flush", delete_row):
+            event.remove(db.session, "before_flush", delete_row)
+    # rolled back with the reschedule
+    assert db.session.get(DosuSess, dosusess_id) is not None
+    assert timeslot_count(dosusess_id) == 2
+
+
+def test_update_of_a_dosusess_deleted_concurrently(schedule, client, monkeypatch):
+    dosusess_id = book(schedule).id
+    reschedule = dosusess_views.reschedule_dosusess
+
+    def reschedule_after_delete(id, *args, **kwargs):
+        delete_elsewhere(id)
+        return reschedule(id, *args, **kwargs)
+
+    monkeypatch.setattr(
+        dosusess_views, "reschedule_dosusess", reschedule_after_delete
+    )
+    response = client.post(
+        f"/dosusess/update?id={dosusess_id}&next=/",
+        data={
+            "status": "active",
+            "note": "",
+            "is_first": "False",
+            "dosusess_date": NEW_DATE.isoformat(),
+            "dosutype_id": schedule.dosutype_id,
+            "room": 2,
+            "slot": 0,
+        },
+    )
+    assert response.status_code == 404
+
+
+def test_reschedule_locks_the_old_and_the_new_date(schedule, monkeypatch):
+    dosusess_id = book(schedule).id
+    locked = []
+    lock_dates = booking.lock_dates
+
+    def recording_lock_dates(dates, *args, **kwargs):
+        dates = list(dates)
+        locked.append(sorted(dates))
+        return lock_dates(dates, *args, **kwargs)
+
+    monkeypatch.setattr(booking, "lock_dates", recording_lock_dates)
+    reschedule_dosusess(
+        dosusess_id,
+        NEW_DATE,
+        2,
+        4,
+        db.session.get(DosuType, schedule.dosutype_id),
+        worker_id=schedule.worker_ids[1],
+    )
+
+    assert locked == [[SESS_DATE, NEW_DATE]]
+    slots = db.session.execute(
+        db.select(DateTable.date, TimeSlot.room, TimeSlot.number)
+        .join(TimeSlot.date)
+        .filter(TimeSlot.dosusess_id == dosusess_id)
+        .order_by(TimeSlot.number)
+    ).all()
+    assert slots == [(NEW_DATE, 2, 4), (NEW_DATE, 2, 5)]
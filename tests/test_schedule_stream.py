@@ -0,0 +1,66 @@
+from datetime import date
+
+import pytest
+
+from scheduler import db
+from scheduler.events import schedule_events
+from scheduler.models import REFERENCE_SCOPE, bump_schedule_versions
+
+SESS_DATE = date(2030, 1, 7)
+
+
+@pytest.fixture
+def poller(app, monkeypatch):
+    monkeypatch.setattr(schedule_events.poller, "interval", 0.05)
+    return schedule_events.poller
+
+
+def bump_elsewhere(*scopes):
+    """
+    Bumps the versions on another connection, like another worker process
+    """
+    with db.engine.connect() as connection:
+        bump_schedule_versions(connection, scopes)
+        connection.commit()
+
+
+def test_poller_resets_the_streams_changed_elsewhere(poller):
+    with schedule_events.subscribe(SESS_DATE, SESS_DATE) as subscription:
+        with schedule_events.subscribe(date(2030, 2, 1), date(2030, 2, 1)) as other:
+            # the first poll only reads the versions
+            assert subscription.get(timeout=0.2) is None
+            bump_elsewhere(date(2030, 3, 1))
+            assert subscription.get(timeout=0.3) is None
+
+            bump_elsewhere(SESS_DATE)
+            assert subscription.get(timeout=1) == {"type": "reset"}
+            assert other.get(timeout=0.2) is None
+
+            bump_elsewhere(REFERENCE_SCOPE)
+            assert subscription.get(timeout=1) == {"type": "reset"}
+            assert other.get(timeout=1) == {"type": "reset"}
+
+
+def test_poller_skips_the_dates_of_own_events(poller):
+    with schedule_events.subscribe(SESS_DATE, SESS_DATE) as subscription:
+        assert subscription.get(timeout=0.2) is None
+        event = {"type": "update", "id": 1, "date": SESS_DATE.isoformat()}
+        bump_elsewhere(SESS_DATE)
+        schedule_events.dispatch([event])
+
+        assert subscription.get(timeout=1) == event
+        assert subscription.get(timeout=0.3) is None
+
+
+def test_stream_beyond_the_limit_asks_to_retry_later(client, monkeypatch):
+    monkeypatch.setattr(schedule_events, "max_subscriptions", 1)
+    url = f"/dosusess/stream?start_date={SESS_DATE.isoformat()}"
+    first = client.get(url, buffered=False)
+    try:
+        assert next(first.response) == b"retry: 3000\n\n"
+        second = client.get(url)
+        assert second.status_code == 200
+        assert second.data == b"retry: 30000\n\n"
+    finally:
+        first.close()
+    assert len(schedule_events) == 0